@@ -1,19 +1,42 @@
 import random
+import numpy as np
 import pandas as pd
 
+import simlog
 from routeplanner import RoutePlanner
+from replaybuffer import ReplayBuffer
+from seeding import make_random
+from trialstats import TrialStats
 
 # from altair import Chart
 # import matplotlib.pyplot as plt
 
+# QLearningAgent state is (light, oncoming, left, right, next_waypoint), encoded as one small integer
+light_codes = {'red': 0, 'green': 1}
+action_codes = {None: 0, 'forward': 1, 'left': 2, 'right': 3}
+n_states = len(light_codes) * len(action_codes) ** 4
+no_state = n_states  # previous state at the first step of a trial
+
+
+def encode_state(inputs, next_waypoint):
+    """Map sensed inputs and next_waypoint to a state index in [0, n_states)."""
+    state = light_codes[inputs['light']]
+    state = state * 4 + action_codes[inputs['oncoming']]
+    state = state * 4 + action_codes[inputs['left']]
+    state = state * 4 + action_codes[inputs['right']]
+    return state * 4 + action_codes[next_waypoint]
+
+
 class Agent(object):
     """Base class for all agents."""
 
-    def __init__(self, env):
+    def __init__(self, env, seed=None):
         self.env = env
         self.state = None
         self.next_waypoint = None
         self.color = 'cyan'
+        self.seed = seed  # if set, Environment.reset() reseeds self.random for each trial
+        self.random = make_random(seed)
 
     def reset(self, destination=None):
         pass
@@ -35,8 +58,13 @@ class DummyAgent(Agent):
 
     def __init__(self, env):
         super(DummyAgent, self).__init__(env)  # sets self.env = env, state = None, next_waypoint = None, and a default color
-        self.next_waypoint = random.choice([None, 'forward', 'left', 'right'])
-        self.color = random.choice(self.color_choices)
+        self.random = env.random  # dummies are part of the environment, so they share its stream
+        self.next_waypoint = self.random.choice([None, 'forward', 'left', 'right'])
+        self.color = self.random.choice(self.color_choices)
+
+    def reset(self, destination=None):
+        if self.env.seed is not None:
+            self.next_waypoint = self.random.choice([None, 'forward', 'left', 'right'])  # independent of past trials
 
     def update(self, t):
         inputs = self.env.sense(self)
@@ -55,7 +83,7 @@ class DummyAgent(Agent):
         action = None
         if action_okay:
             action = self.next_waypoint
-            self.next_waypoint = random.choice([None, 'forward', 'left', 'right'])
+            self.next_waypoint = self.random.choice([None, 'forward', 'left', 'right'])
         reward = self.env.act(self, action)
         #print "DummyAgent.update(): t = {}, inputs = {}, action = {}, reward = {}".format(t, inputs, action, reward)  # [debug]
         #print "DummyAgent.update(): next_waypoint = {}".format(self.next_waypoint)  # [debug]
@@ -63,9 +91,9 @@ class DummyAgent(Agent):
 class RandomAgent(Agent):
     """An agent that learns to drive in the smartcab world."""
 
-    def __init__(self, env):
+    def __init__(self, env, seed=None):
         super(RandomAgent, self).__init__(
-            env)  # sets self.env = env, state = None, next_waypoint = None, and a default color
+            env, seed)  # sets self.env = env, state = None, next_waypoint = None, and a default color
         self.color = 'red'  # override color
         self.planner = RoutePlanner(self.env, self)  # simple route planner to get next_waypoint
 
@@ -98,20 +126,43 @@ class RandomAgent(Agent):
         deadline = self.env.get_deadline(self)
 
         # Random update of the state
-        action = random.choice([None, 'forward', 'left', 'right'])
+        action = self.random.choice([None, 'forward', 'left', 'right'])
 
         # Execute action and get reward
         reward = self.env.act(self, action)
 
-        print "LearningAgent.update(): deadline = {}, inputs = {}, action = {}, reward = {}" . \
-            format(deadline, inputs, action, reward)
+        simlog.trace("LearningAgent.update(): deadline = %s, inputs = %s, action = %s, reward = %s",
+                     deadline, inputs, action, reward)
+
+class ExternalAgent(Agent):
+    """Primary agent driven from outside the environment (e.g. by BatchEnvironment or EnvironmentServer):
+    on each step it takes the action set in self.action, and keeps the reward it got in self.reward."""
+
+    def __init__(self, env):
+        super(ExternalAgent, self).__init__(env)
+        self.color = 'red'
+        self.planner = RoutePlanner(self.env, self)
+        self.action = None  # action to take on the next step
+        self.reward = 0.0
+
+    def reset(self, destination=None):
+        self.planner.route_to(destination)
+
+    def update(self, t):
+        self.next_waypoint = self.planner.next_waypoint()
+        self.reward = self.env.act(self, self.action)
+
+    def stats_by_simulation_add_row(self, success):
+        pass  # stats are up to whoever drives the agent
 
 class QLearningAgent(Agent):
     """An agent that learns to drive in the smartcab world."""
 
-    def __init__(self, env, alpha_rate=0.7, epsilon_rate=0.9, gamma_rate=0.5, q_init_value=10.0, debug_traces=False):
+    def __init__(self, env, alpha_rate=0.7, epsilon_rate=0.9, gamma_rate=0.5, q_init_value=10.0, seed=None,
+                 stats_window=10, stats_capacity=1000, replay_capacity=0, replay_batch_size=32, replay_period=32,
+                 align_rewards=False):
         # sets self.env = env, state = None, next_waypoint = None, and a default color
-        super(QLearningAgent, self).__init__(env)
+        super(QLearningAgent, self).__init__(env, seed)
 
         self.color = 'red'  # override color
         self.planner = RoutePlanner(self.env, self)  # simple route planner to get next_waypoint
@@ -123,62 +174,96 @@ class QLearningAgent(Agent):
         self.gamma = gamma_rate  # Discount factor rate
         self.q_init_value = q_init_value  # Initial value for the q matrix
 
-        self.q_matrix = {}
+        # Q-table indexed by [state, action code]; the extra last row is no_state, so the first step of
+        # each trial is learned like any other (as the dict-based Q-matrix used to do with a None key)
+        self.q_matrix = np.full((n_states + 1, len(self.valid_actions)), q_init_value, dtype=float)
+        self.q_learned = np.zeros(self.q_matrix.shape, dtype=bool)  # (state, action) pairs learned so far
+
+        # Update rule: by default (as the agent always learned) each reward is credited to the previous state and
+        # action (see learn); with align_rewards, each transition (state, action, its reward, next state) is learned
+        # once the next state is sensed (see learn_transition)
+        self.align_rewards = align_rewards or replay_capacity > 0
 
-        self.previous_state = None
+        # Experience replay (off unless replay_capacity > 0, always with aligned rewards): the agent also keeps the
+        # last replay_capacity transitions, and every replay_period transitions learns a minibatch of
+        # replay_batch_size of them again, in one go
+        self.replay_buffer = ReplayBuffer(replay_capacity, seed) if replay_capacity > 0 else None
+        self.replay_batch_size = replay_batch_size
+        self.replay_period = replay_period
+
+        self.previous_state = no_state
         self.previous_action = None
+        self.previous_reward = None
 
         self.cum_reward = 0
         self.stats = []
-        self.stats_by_simulation = []
+        self.trial_stats = TrialStats(stats_window, stats_capacity)  # per-simulation stats (rows kept unless stats_capacity=0)
 
         self.actions_count = 0
         self.traffic_violations_count = 0
 
-        self.debug_traces = debug_traces
-
-    def stats_by_simulation_add_row(self, success):
-        row = {
-            'simulation_round': len(self.stats_by_simulation) + 1,
-            'success': success,
-            'cum_reward': self.cum_reward,
-            'explored_states_cum': len(self.q_matrix),
-            'traffic_violations_count': self.traffic_violations_count,
-            'actions_count': self.actions_count - 1,
+    @property
+    def explored_states_count(self):
+        """No. of (state, action) pairs learned so far (by every agent sharing the Q-table, see share_q_table)."""
+        return int(np.count_nonzero(self.q_learned))
+
+    def share_q_table(self, agent):
+        """Learn into agent's Q-table (and replay buffer, if both replay) from now on, e.g. as a learner of the
+        same Environment (see Environment.add_learner): every car driving adds to the same experience."""
+        self.q_matrix = agent.q_matrix
+        self.q_learned = agent.q_learned
+        if self.replay_buffer is not None and agent.replay_buffer is not None:
+            self.replay_buffer = agent.replay_buffer
+
+    def checkpoint_state(self):
+        """Everything learned so far, for checkpoint.save (taken between trials)."""
+        return {
+            'q_matrix': self.q_matrix,
+            'q_learned': self.q_learned,
+            'stats': self.stats,
+            'trial_stats': self.trial_stats,
+            'replay_buffer': self.replay_buffer,
+            'random': self.random.getstate(),
         }
 
-        self.stats_by_simulation.append(row)
+    def restore_checkpoint_state(self, state):
+        # Tables and replay buffer are restored in place, so agents sharing them keep sharing them; a learner's
+        # state leaves out what it shares with the primary agent (see checkpoint.save), restored with the primary's
+        if 'q_matrix' in state:
+            self.q_matrix[...] = state['q_matrix']
+            self.q_learned[...] = state['q_learned']
+        if 'replay_buffer' in state:
+            if self.replay_buffer is not None and state['replay_buffer'] is not None:
+                self.replay_buffer.restore(state['replay_buffer'])
+            else:
+                self.replay_buffer = state['replay_buffer']
+        self.stats = state['stats']
+        self.trial_stats = state['trial_stats']
+        self.random.setstate(state['random'])
+
+    def stats_by_simulation_add_row(self, success):
+        self.trial_stats.add(success, self.cum_reward, self.explored_states_count, self.traffic_violations_count,
+                             self.actions_count - 1)
 
     def stats_by_simulation_get(self):
-        return self.stats_by_simulation
+        return self.stats_by_simulation_get_as_df().to_dict('records')
 
     def stats_by_simulation_get_as_df(self):
-        df = pd.DataFrame(
-            data=self.stats_by_simulation,
-            columns=[
-                'simulation_round',
-                'success',
-                'cum_reward',
-                'explored_states_cum',
-                'traffic_violations_count',
-                'actions_count'
-            ]
-        )
-
-        return df
+        return self.trial_stats.as_df()
 
     def stats_add_row(self, success):
         iteration = len(self.stats) + 1
         self.stats.append(
-            (iteration, len(self.q_matrix), self.cum_reward, success, self.actions_count, self.moves_available)
+            (iteration, self.explored_states_count, self.cum_reward, success, self.actions_count, self.moves_available)
         )
 
     def reset(self, destination=None):
         self.planner.route_to(destination)
 
         self.state = None
-        self.previous_state = None
+        self.previous_state = no_state
         self.previous_action = None
+        self.previous_reward = None
 
         self.cum_reward = 0
 
@@ -189,38 +274,63 @@ class QLearningAgent(Agent):
         return self.cum_reward
 
     def get_q_value(self, state, action):
-        key = (state, action)
-        return self.q_matrix.get(key, self.q_init_value)
+        return self.q_matrix.item(state, action_codes[action])
 
     def choose_action(self, state):
-        if random.random() < self.epsilon:  # explore
-            action = random.choice(self.valid_actions)
+        if self.random.random() < self.epsilon:  # explore
+            action = self.random.choice(self.valid_actions)
         else:  # exploit
-            q = [self.get_q_value(state, a) for a in self.valid_actions]
+            q = self.q_matrix[state].tolist()  # plain floats: faster than NumPy calls on a 4-element row
             max_q = max(q)
-            count = q.count(max_q)
-            if count > 1:
-                best = [i for i in range(len(self.valid_actions)) if q[i] == max_q]
-                i = random.choice(best)
-                action = self.valid_actions[i]
+            if q.count(max_q) > 1:
+                i = self.random.choice([i for i, q_value in enumerate(q) if q_value == max_q])
             else:
                 i = q.index(max_q)
-                action = self.valid_actions[i]
+            action = self.valid_actions[i]
 
         return action
 
     def learn(self, previous_state, previous_action, reward, state):
-        # Please, notice that get_q_value returns 0.0 is no Q-value found, this is equivalent to set initial condition
+        # Please, notice that q_matrix is filled with self.q_init_value on creation, this is the initial condition
         # for Q-matrix
-        old_q_value = self.get_q_value(previous_state, previous_action)
+        a = action_codes[previous_action]
+        old_q_value = self.q_matrix.item(previous_state, a)
 
-        max_q_new = max([self.get_q_value(state, a) for a in self.valid_actions])
+        max_q_new = max(self.q_matrix[state].tolist())
 
         learned_value = reward + self.gamma * max_q_new
 
-        new_q_value = old_q_value + self.alpha * (learned_value - old_q_value)
+        self.q_matrix.itemset((previous_state, a), old_q_value + self.alpha * (learned_value - old_q_value))
+
+        self.q_learned.itemset((previous_state, a), True)
+
+    def learn_transition(self, state, action, reward, next_state, done):
+        """Learn one transition (align_rewards: action is the one that got reward), and keep it in replay mode."""
+        a = action_codes[action]
+        old_q_value = self.q_matrix.item(state, a)
+        learned_value = reward if done else reward + self.gamma * max(self.q_matrix[next_state].tolist())
+        self.q_matrix.itemset((state, a), old_q_value + self.alpha * (learned_value - old_q_value))
 
-        self.q_matrix[(previous_state, previous_action)] = new_q_value
+        self.q_learned.itemset((state, a), True)
+
+        if self.replay_buffer is not None:
+            self.replay_buffer.add(state, a, reward, next_state, done)
+            if self.replay_buffer.count % self.replay_period == 0:
+                self.replay(*self.replay_buffer.sample(self.replay_batch_size))
+
+    def replay(self, states, actions, rewards, next_states, dones):
+        """Learn a minibatch of transitions (arrays, as ReplayBuffer.sample returns them) at once.
+
+        Every transition is learned from the same Q-table, as one vectorized update; transitions sharing a
+        (state, action) pair are averaged, so a pair drawn twice does not move twice as far.
+        """
+        q = self.q_matrix
+        deltas = rewards + np.where(dones, 0.0, self.gamma * q[next_states].max(axis=1)) - q[states, actions]
+        pairs = states * q.shape[1] + actions
+        sums = np.bincount(pairs, weights=deltas, minlength=q.size)
+        counts = np.bincount(pairs, minlength=q.size)
+        learned = np.flatnonzero(counts)
+        q.reshape(-1)[learned] += self.alpha * sums[learned] / counts[learned]
 
     def update(self, t):
         # Gather inputs
@@ -229,9 +339,11 @@ class QLearningAgent(Agent):
         deadline = self.env.get_deadline(self)
 
         # Update state
-        self.state = inputs
-        self.state['next_waypoint'] = self.next_waypoint
-        self.state = tuple(sorted(self.state.items()))
+        self.state = encode_state(inputs, self.next_waypoint)
+
+        # Aligned rewards: the previous action led to this state
+        if self.align_rewards and self.previous_reward is not None:
+            self.learn_transition(self.previous_state, self.previous_action, self.previous_reward, self.state, False)
 
         # Select action according to your policy
         action = self.choose_action(self.state)
@@ -247,13 +359,16 @@ class QLearningAgent(Agent):
         # Code for stats purpose - END
 
         # Learn policy based on state, action, reward
-        if reward is not None:
+        if self.align_rewards:
+            if self in self.env.finished:  # reached the destination: there is no next state to learn from
+                self.learn_transition(self.state, action, reward, self.state, True)
+        elif reward is not None:
             self.learn(self.previous_state, self.previous_action, reward, self.state)
 
         # Set previous_state as current value of state
         self.previous_state = self.state
         self.previous_action = action
+        self.previous_reward = reward
 
-        if self.debug_traces:
-            print "\tLearningAgent.update(): deadline = {}, inputs = {}, action = {}, reward = {}" . \
-                format(deadline, inputs, action, reward)  # [debug]
+        simlog.trace("\tLearningAgent.update(): deadline = %s, inputs = %s, action = %s, reward = %s",
+                     deadline, inputs, action, reward)  # [debug]
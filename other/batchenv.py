@@ -0,0 +1,75 @@
+import numpy as np
+
+from agents import ExternalAgent
+from environment import Environment
+from seeding import derive_seed
+
+# Columns of an observation array, all integers: light is 1 for green, oncoming, left, right and next_waypoint are
+# indices into Environment.valid_actions (as in smartcab's VecEnvironment and envprotocol)
+observation_fields = ['light', 'oncoming', 'left', 'right', 'next_waypoint', 'deadline']
+action_codes = dict((action, i) for i, action in enumerate(Environment.valid_actions))
+
+
+def observation(env, agent):
+    """Observation of env's primary agent (an ExternalAgent), as a tuple of observation_fields."""
+    agent.next_waypoint = agent.planner.next_waypoint()
+    inputs = env.sense(agent)
+    return (int(inputs['light'] == 'green'), action_codes[inputs['oncoming']], action_codes[inputs['left']],
+            action_codes[inputs['right']], action_codes[agent.next_waypoint], env.get_deadline(agent))
+
+
+class BatchEnvironment(object):
+    """A batch of Environments behind a Gym-style interface: reset() and step(actions) on all of them at once.
+
+    Observations are an (n_envs, len(observation_fields)) int array of what each agent senses when it takes its
+    next action (see Environment.advance). Actions are action codes, so a learner needs no Agent subclass: each
+    environment's primary agent is an ExternalAgent taking the actions given.
+    Environments take env_kwargs (e.g. grid_size, dummy_fleet, scenarios); with a seed, environment i is seeded
+    from (seed, i). Environments whose trial ends in step() start a new trial right away.
+    """
+
+    def __init__(self, n_envs=1, enforce_deadline=True, seed=None, **env_kwargs):
+        self.envs = []
+        self.agents = []
+        for i in xrange(n_envs):
+            env = Environment(seed=derive_seed(seed, i) if seed is not None else None, **env_kwargs)
+            agent = env.create_agent(ExternalAgent)
+            env.set_primary_agent(agent, enforce_deadline=enforce_deadline)
+            self.envs.append(env)
+            self.agents.append(agent)
+
+    @property
+    def n_envs(self):
+        return len(self.envs)
+
+    def reset(self):
+        """Start a new trial in every environment; returns the observations."""
+        for env in self.envs:
+            env.reset()
+            env.advance()  # observations are what the agents will act on
+        return self.observe()
+
+    def observe(self):
+        return np.array([observation(env, agent) for env, agent in zip(self.envs, self.agents)], dtype=int)
+
+    def step(self, actions):
+        """Step every environment, its primary agent taking the given action (an action code each).
+
+        Returns (observations, rewards, done, info), info holding 'success' and 'timeout' flags by environment, as
+        VecEnvironment.step does (timeout: done without success). Environments
+        flagged in done have already been reset: their observations are of their new trial.
+        """
+        rewards = np.zeros(self.n_envs)
+        done = np.zeros(self.n_envs, dtype=bool)
+        success = np.zeros(self.n_envs, dtype=bool)
+        for i, (env, agent, action) in enumerate(zip(self.envs, self.agents, np.asarray(actions).tolist())):
+            agent.action = Environment.valid_actions[action]
+            agent.reward = 0.0
+            env.step()
+            rewards[i] = agent.reward
+            if env.done:
+                done[i] = True
+                success[i] = env.trial_success
+                env.reset()
+            env.advance()  # sense the next tick's lights and traffic, which the agent acts on
+        return self.observe(), rewards, done, {'success': success, 'timeout': done & ~success}
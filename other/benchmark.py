@@ -0,0 +1,208 @@
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+
+from environment import Environment
+from agents import QLearningAgent, n_states
+from simulator import Simulator
+
+# Parameter sweeps: the full suite, and a quick one for checking a change
+sweeps = {
+    'full': {'num_dummies': [3, 30, 300], 'grid_size': [(8, 6), (32, 32), (100, 100)], 'n_trials': [10, 100]},
+    'quick': {'num_dummies': [3, 30], 'grid_size': [(8, 6), (32, 32)], 'n_trials': [10]},
+}
+
+
+def make_environment(num_dummies, grid_size):
+    """Environment with a QLearningAgent as primary agent, reset and stepped a little, so caches are warm."""
+    random.seed(0)
+    env = Environment(num_dummies=num_dummies, grid_size=grid_size)
+    agent = QLearningAgent(env)
+    env.set_primary_agent(agent)
+    env.reset()
+    for i in xrange(10):
+        env.step()
+    return env, agent
+
+
+def bench_step(num_dummies, grid_size):
+    env, agent = make_environment(num_dummies, grid_size)
+
+    def step():
+        env.step()
+        if env.done:
+            env.reset()
+    return step
+
+
+def bench_sense(num_dummies, grid_size):
+    env, agent = make_environment(num_dummies, grid_size)
+    return lambda: env.sense(agent)
+
+
+def bench_act(num_dummies, grid_size):
+    env, agent = make_environment(num_dummies, grid_size)
+    actions = itertools.cycle(env.valid_actions)
+    return lambda: env.act(agent, next(actions))
+
+
+def bench_next_waypoint(num_dummies, grid_size):
+    env, agent = make_environment(num_dummies, grid_size)
+    return agent.planner.next_waypoint
+
+
+def bench_choose_action(num_dummies, grid_size):
+    env, agent = make_environment(num_dummies, grid_size)
+    states = itertools.cycle([random.randrange(n_states) for i in xrange(1000)])
+    return lambda: agent.choose_action(next(states))
+
+
+def bench_learn(num_dummies, grid_size):
+    env, agent = make_environment(num_dummies, grid_size)
+    transitions = itertools.cycle([(random.randrange(n_states), random.choice(env.valid_actions), random.choice([-1.0, -0.5, 0.0, 2.0]),
+                                    random.randrange(n_states)) for i in xrange(1000)])
+    return lambda: agent.learn(*next(transitions))
+
+
+# name -> (setup(num_dummies, grid_size) returning the function to time, depends on num_dummies/grid_size)
+call_benchmarks = [
+    ('Environment.step', bench_step, True),
+    ('Environment.sense', bench_sense, True),
+    ('Environment.act', bench_act, True),
+    ('RoutePlanner.next_waypoint', bench_next_waypoint, False),
+    ('QLearningAgent.choose_action', bench_choose_action, False),
+    ('QLearningAgent.learn', bench_learn, False),
+]
+
+
+def time_calls(function, min_time=0.2, repeat=3):
+    """Best-of-repeat seconds per call, timing enough calls to take about min_time secs each time."""
+    number = 1
+    while True:
+        start = timeit.default_timer()
+        for i in xrange(number):
+            function()
+        elapsed = timeit.default_timer() - start
+        if elapsed >= min_time / 10 or number >= 10 ** 7:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = None
+    for r in xrange(repeat):
+        start = timeit.default_timer()
+        for i in xrange(number):
+            function()
+        per_call = (timeit.default_timer() - start) / number
+        best = per_call if best is None else min(best, per_call)
+    return best, number
+
+
+def time_simulator_run(num_dummies, grid_size, n_trials, repeat=3):
+    """Best-of-repeat wall time of a headless Simulator.run, with the no. of steps simulated."""
+    best = None
+    for r in xrange(repeat):
+        random.seed(0)
+        env = Environment(num_dummies=num_dummies, grid_size=grid_size)
+        env.set_primary_agent(QLearningAgent(env), enforce_deadline=True)
+        simulator = Simulator(env, display=False)
+        start = timeit.default_timer()
+        results = simulator.run(n_trials=n_trials)
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, int(results['steps'].sum()))
+    return best
+
+
+def run_benchmarks(sweep, min_time=0.2, repeat=3, only=None):
+    """Run every benchmark over the sweep; returns a list of result records."""
+    records = []
+    configurations = list(itertools.product(sweep['num_dummies'], sweep['grid_size']))
+    for name, setup, depends_on_env in call_benchmarks:
+        if only is not None and only != name:
+            continue
+        for num_dummies, grid_size in (configurations if depends_on_env else configurations[:1]):
+            secs_per_call, calls = time_calls(setup(num_dummies, grid_size), min_time, repeat)
+            records.append({
+                'benchmark': name, 'num_dummies': num_dummies, 'grid_size': list(grid_size), 'n_trials': None,
+                'calls': calls, 'secs_per_call': secs_per_call, 'calls_per_sec': 1.0 / secs_per_call,
+            })
+            report(records[-1])
+
+    if only is None or only == 'Simulator.run':
+        for (num_dummies, grid_size), n_trials in itertools.product(configurations, sweep['n_trials']):
+            elapsed, steps = time_simulator_run(num_dummies, grid_size, n_trials, repeat)
+            records.append({
+                'benchmark': 'Simulator.run', 'num_dummies': num_dummies, 'grid_size': list(grid_size), 'n_trials': n_trials,
+                'calls': steps, 'secs_per_call': elapsed / steps, 'calls_per_sec': steps / elapsed,
+            })
+            report(records[-1])
+    return records
+
+
+def record_key(record):
+    return (record['benchmark'], record['num_dummies'], tuple(record['grid_size']), record['n_trials'])
+
+
+def report(record):
+    print "{:<30} dummies={:<4} grid={:<8} trials={:<5} {:>12.2f} calls/s {:>10.2f} us/call".format(
+        record['benchmark'], record['num_dummies'], '{}x{}'.format(*record['grid_size']),
+        record['n_trials'] if record['n_trials'] is not None else '-', record['calls_per_sec'], record['secs_per_call'] * 1e6)
+
+
+def compare(records, baseline_records, tolerance):
+    """Print each benchmark's change against the baseline; return the records that got slower than tolerance."""
+    baseline = dict((record_key(record), record) for record in baseline_records)
+    regressions = []
+    for record in records:
+        old = baseline.get(record_key(record))
+        if old is None:
+            continue
+        ratio = record['secs_per_call'] / old['secs_per_call']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  <-- REGRESSION'
+            regressions.append(record)
+        print "{:<30} dummies={:<4} grid={:<8} trials={:<5} {:>+8.1f}%{}".format(
+            record['benchmark'], record['num_dummies'], '{}x{}'.format(*record['grid_size']),
+            record['n_trials'] if record['n_trials'] is not None else '-', (ratio - 1) * 100, flag)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the simulation hot paths (steps/sec and per-call latency).")
+    parser.add_argument('--sweep', choices=sorted(sweeps), default='full', help="parameter sweep to run")
+    parser.add_argument('--only', help="run only the benchmark with this name (e.g. Simulator.run)")
+    parser.add_argument('--min-time', type=float, default=0.2, help="approx. secs per timing run")
+    parser.add_argument('--repeat', type=int, default=3, help="timing runs per benchmark (the best one is kept)")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file to write results to")
+    parser.add_argument('--compare', help="JSON results of a previous run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="slowdown ratio over the baseline flagged as a regression")
+    args = parser.parse_args()
+
+    records = run_benchmarks(sweeps[args.sweep], args.min_time, args.repeat, args.only)
+    with open(args.output, 'w') as f:
+        json.dump({
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'sweep': args.sweep,
+            'results': records,
+        }, f, indent=2)
+    print "Results written to {}".format(args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(records, json.load(f)['results'], args.tolerance)
+        if regressions:
+            print "{} regression(s) over {:.0f}%".format(len(regressions), args.tolerance * 100)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import cPickle as pickle
+import glob
+import os
+import numpy as np
+
+state_file = 'state.pkl'
+
+
+def exists(path):
+    return os.path.exists(os.path.join(path, state_file))
+
+
+def save(path, simulator, results):
+    """Write the training state of simulator's environment, primary agent and learners, after len(results) trials,
+    to directory path.
+
+    Arrays of the agents (the Q-table) are written as .npy files, everything else goes to state.pkl, which is
+    replaced last (atomically), so a crash while saving leaves the previous checkpoint.
+    What a learner shares with the primary agent (see QLearningAgent.share_q_table) is saved once, with the primary.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    env = simulator.env
+    agent_state = env.primary_agent.checkpoint_state()
+    learner_states = [learner.checkpoint_state() for learner in env.learners]
+    for learner_state in learner_states:
+        for name, value in learner_state.items():
+            if value is not None and value is agent_state.get(name):
+                del learner_state[name]
+
+    arrays = {}
+    for prefix, state in [('', agent_state)] + [('learner{}-'.format(i), s) for i, s in enumerate(learner_states)]:
+        for name, value in state.items():
+            if isinstance(value, np.ndarray):
+                arrays[prefix + name] = '{}{}-{}.npy'.format(prefix, name, len(results))
+                np.save(os.path.join(path, arrays[prefix + name]), value)
+                del state[name]
+
+    state = {
+        'results': np.array(results),
+        'environment': env.checkpoint_state(),
+        'agent': agent_state,
+        'learners': learner_states,
+        'arrays': arrays,
+    }
+    with open(os.path.join(path, state_file + '.tmp'), 'wb') as f:
+        pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    os.rename(os.path.join(path, state_file + '.tmp'), os.path.join(path, state_file))
+
+    # Arrays of older checkpoints
+    for filename in glob.glob(os.path.join(path, '*.npy')):
+        if os.path.basename(filename) not in arrays.values():
+            os.remove(filename)
+
+
+def load(path, simulator):
+    """Restore the state saved by save() into simulator's environment, primary agent and learners; returns the
+    results so far."""
+    with open(os.path.join(path, state_file), 'rb') as f:
+        state = pickle.load(f)
+    env = simulator.env
+    agent_state = state['agent']
+    learner_states = state.get('learners', [])
+    if len(learner_states) != len(env.learners):
+        raise ValueError("Checkpoint {} has {} learners, the environment {}".format(path, len(learner_states), len(env.learners)))
+    for key, filename in state['arrays'].iteritems():
+        prefix, _, name = key.partition('-') if key.startswith('learner') else ('', '', key)
+        target = learner_states[int(prefix[len('learner'):])] if prefix else agent_state
+        target[name] = np.load(os.path.join(path, filename))  # read eagerly: the agent copies it into its arrays
+    env.restore_checkpoint_state(state['environment'])
+    env.primary_agent.restore_checkpoint_state(agent_state)
+    for learner, learner_state in zip(env.learners, learner_states):
+        learner.restore_checkpoint_state(learner_state)
+    return state['results']
@@ -0,0 +1,129 @@
+import numpy as np
+
+from agents import DummyAgent
+
+headings = [(1, 0), (0, -1), (-1, 0), (0, 1)]  # ENWS, same order as Environment.valid_headings
+actions = [None, 'forward', 'left', 'right']  # same order as Environment.valid_actions
+NONE, FORWARD, LEFT, RIGHT = range(len(actions))
+turn_offsets = np.array([0, 0, 1, 3])  # heading index offset by action: in ENWS order, left is +1 and right is -1
+
+
+class DummyFleet(object):
+    """All the dummy agents of an Environment, stored as arrays and moved together once per step.
+
+    Each dummy follows the right-of-way rules of DummyAgent.update, but all of them sense the state at the start
+    of the step and then move at once (DummyAgent objects move one after another). Dummies come before every
+    agent object in agent order: the primary agent senses them after they moved, as it would with DummyAgents.
+    """
+
+    def __init__(self, env, n):
+        self.env = env
+        self.n = n
+        self.random = np.random.RandomState(env.random.getrandbits(32))  # derived from the environment's stream
+
+        # Intersection reached by moving one block along each heading (-1: no road)
+        self.neighbour = np.full((len(env.intersections), len(headings)), -1, dtype=int)
+        for location, i in env.intersections.iteritems():
+            for h, heading in enumerate(headings):
+                next_location = env.next_location(location, heading)
+                if next_location is not None:
+                    self.neighbour[i, h] = env.intersections[next_location]
+
+        self.location = self.random.randint(len(env.intersections), size=n)  # intersection index
+        self.heading = np.full(n, headings.index((0, 1)), dtype=int)
+        self.waypoint = self.random.randint(len(actions), size=n)  # action index
+        self.colors = [DummyAgent.color_choices[i] for i in self.random.randint(len(DummyAgent.color_choices), size=n)]
+        self.index_locations()
+
+    def reset(self, redraw_waypoints=False, placements=None):
+        """Scatter the dummies at random locations and headings for a new trial (or at placements: index arrays
+        of their locations and headings, as read from a ScenarioBank)."""
+        self.random.seed(self.env.random.getrandbits(32))
+        if placements is not None:
+            self.location, self.heading = [np.array(column, dtype=int) for column in placements]
+        else:
+            self.location = self.random.randint(len(self.env.intersections), size=self.n)
+            self.heading = self.random.randint(len(headings), size=self.n)
+        if redraw_waypoints:
+            self.waypoint = self.random.randint(len(actions), size=self.n)
+        self.index_locations()
+
+    def checkpoint_state(self):
+        return {'random': self.random.get_state(), 'waypoint': self.waypoint, 'colors': self.colors}
+
+    def restore_checkpoint_state(self, state):
+        self.random.set_state(state['random'])
+        self.waypoint = state['waypoint']
+        self.colors = state['colors']
+
+    def index_locations(self):
+        """Sort dummies by location, so that agents_at() is a binary search."""
+        self.by_location = np.argsort(self.location, kind='mergesort')  # stable: dummies stay in agent order
+        self.sorted_location = self.location[self.by_location]
+
+    def agents_at(self, location):
+        """(heading, next_waypoint) of the dummies at location, in agent order."""
+        i = self.env.intersections[location]
+        start, end = np.searchsorted(self.sorted_location, [i, i + 1]).tolist()
+        return [(headings[self.heading.item(d)], actions[self.waypoint.item(d)]) for d in sorted(self.by_location[start:end].tolist())]
+
+    def update(self):
+        """Move every dummy whose next waypoint is allowed, as DummyAgent.update does, and pick new waypoints."""
+        env = self.env
+        location, heading, waypoint = self.location, self.heading, self.waypoint
+
+        # What each dummy senses, from every agent at the same intersection (dummies first, then agent objects)
+        others = [(env.intersections[state['location']], headings.index(state['heading']), actions.index(agent.get_next_waypoint()))
+                  for agent, state in env.agent_states.iteritems() if agent not in env.finished]
+        all_keys = location * len(headings) + heading
+        all_waypoints = waypoint
+        if others:
+            others = np.array(others, dtype=int)
+            all_keys = np.append(all_keys, others[:, 0] * len(headings) + others[:, 1])
+            all_waypoints = np.append(all_waypoints, others[:, 2])
+        keys, group = np.unique(all_keys, return_inverse=True)  # one group per (location, heading)
+        any_forward = np.bincount(group, weights=all_waypoints == FORWARD, minlength=len(keys)) > 0
+        any_left = np.bincount(group, weights=all_waypoints == LEFT, minlength=len(keys)) > 0
+        last = np.full(len(keys), -1, dtype=int)
+        np.maximum.at(last, group, np.arange(len(all_keys)))
+        last_waypoint = all_waypoints[last]
+
+        def lookup(heading_offset):
+            """Group of the agents at each dummy's location, with the given heading relative to the dummy's."""
+            target = location * len(headings) + (heading + heading_offset) % len(headings)
+            i = np.minimum(np.searchsorted(keys, target), len(keys) - 1)
+            return i, keys[i] == target
+
+        # inputs['left'] == 'forward': any agent coming from the left goes forward ('forward' is never overridden)
+        i, found = lookup(3)
+        left_forward = found & any_forward[i]
+        # inputs['oncoming'] in ('forward', 'right'): 'left' is never overridden, otherwise the last oncoming agent wins
+        i, found = lookup(2)
+        oncoming_blocks = found & ~any_left[i] & ((last_waypoint[i] == FORWARD) | (last_waypoint[i] == RIGHT))
+
+        light_state = env.light_initial[location] ^ ((env.light_t // env.light_period[location]) % 2).astype(bool)  # NS open
+        green = light_state == (heading % 2 == 1)  # odd headings are North/South
+
+        # Right-of-way rules of DummyAgent.update
+        action_okay = np.ones(self.n, dtype=bool)
+        action_okay[waypoint == FORWARD] = green[waypoint == FORWARD]
+        right = waypoint == RIGHT
+        action_okay[right] = green[right] | ~left_forward[right]
+        left = waypoint == LEFT
+        action_okay[left] = green[left] & ~oncoming_blocks[left]
+
+        # Move (unless there is no road that way) and pick the next waypoints
+        moving = action_okay & (waypoint != NONE)
+        new_heading = (heading + turn_offsets[waypoint]) % len(headings)
+        new_location = self.neighbour[location, new_heading]
+        moving &= new_location >= 0
+        self.location = np.where(moving, new_location, location)
+        self.heading = np.where(moving, new_heading, heading)
+        self.waypoint = np.where(action_okay, self.random.randint(len(actions), size=self.n), waypoint)
+        self.index_locations()
+
+    def cars(self):
+        """(location, heading, color, next waypoint, destination) of every dummy, for Simulator.draw."""
+        intersection_list = self.env.intersection_list
+        return [(intersection_list[l], headings[h], color, actions[w], None)
+                for l, h, w, color in zip(self.location.tolist(), self.heading.tolist(), self.waypoint.tolist(), self.colors)]
@@ -0,0 +1,67 @@
+import collections
+import socket
+
+import envprotocol
+
+# Result of a command, as sent back by the server
+Observation = collections.namedtuple('Observation', ['env_id', 'ok', 'done', 'reward', 'deadline', 'inputs', 'next_waypoint'])
+
+
+class EnvironmentClient(object):
+    """Drives environments hosted by an EnvironmentServer (see envserver), from any process.
+
+    Needs only this module and envprotocol (no numpy or pygame). Every method takes a list of environment ids
+    and sends one message for all of them: batch the environments of an agent process to save round-trips.
+    Observations carry the primary agent's inputs as Environment.sense returns them, its deadline and the next
+    waypoint of its route planner.
+    """
+
+    def __init__(self, address):
+        self.sock = socket.socket(socket.AF_UNIX if isinstance(address, basestring) else socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        if self.sock.family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = ''
+
+    def close(self):
+        self.sock.close()
+
+    def call(self, requests):
+        """Send (command, environment id, argument) requests as one message; returns their Observations."""
+        self.sock.sendall(envprotocol.encode(envprotocol.request, requests))
+        while True:
+            messages, self.buffer = envprotocol.split(self.buffer)
+            if messages:
+                return [self.observation(record) for record in envprotocol.decode(envprotocol.reply, messages[0])]
+            data = self.sock.recv(65536)
+            if not data:
+                raise IOError("Connection closed by the environment server")
+            self.buffer += data
+
+    def observation(self, record):
+        env_id, status, done, reward, deadline, light, oncoming, left, right, next_waypoint = record
+        actions = envprotocol.actions
+        inputs = {'light': envprotocol.lights[light], 'oncoming': actions[oncoming], 'left': actions[left], 'right': actions[right]}
+        return Observation(env_id, status == envprotocol.OK, bool(done), reward, deadline, inputs, actions[next_waypoint])
+
+    def create(self, n=1, num_dummies=3, seed=None):
+        """Ids of n new environments (seeded with seed, seed + 1, ... if given); each needs a reset() to start a trial."""
+        return [observation.env_id for observation in self.call(
+            [(envprotocol.CREATE, seed + i if seed is not None else envprotocol.no_seed, num_dummies) for i in xrange(n)])]
+
+    def reset(self, env_ids):
+        return self.call([(envprotocol.RESET, env_id, 0) for env_id in env_ids])
+
+    def sense(self, env_ids):
+        return self.call([(envprotocol.SENSE, env_id, 0) for env_id in env_ids])
+
+    def act(self, env_ids, actions):
+        """Move each primary agent, leaving the rest of its environment as it is (as Environment.act does)."""
+        return self.call([(envprotocol.ACT, env_id, envprotocol.action_codes[action]) for env_id, action in zip(env_ids, actions)])
+
+    def step(self, env_ids, actions):
+        """Step each environment (as Environment.step does), its primary agent taking the given action."""
+        return self.call([(envprotocol.STEP, env_id, envprotocol.action_codes[action]) for env_id, action in zip(env_ids, actions)])
+
+    def close_environments(self, env_ids):
+        return self.call([(envprotocol.CLOSE, env_id, 0) for env_id in env_ids])
@@ -1,24 +1,23 @@
 import random
+import numpy as np
 from collections import OrderedDict
 from agents import DummyAgent
+from dummyfleet import DummyFleet
+from episodetrace import EpisodeTrace
+from roadgraph import RoadGraph
+from scenariobank import ScenarioBank
+from seeding import derive_seed, make_random
+import simlog
 
 class TrafficLight(object):
-    """A traffic light that switches periodically."""
+    """A traffic light that switches periodically: its initial state and period (Environment keeps the lights as
+    arrays, see Environment.light_states)."""
 
     valid_states = [True, False]  # True = NS open, False = EW open
 
-    def __init__(self, state=None, period=None):
-        self.state = state if state is not None else random.choice(self.valid_states)
-        self.period = period if period is not None else random.choice([3, 4, 5])
-        self.last_updated = 0
-
-    def reset(self):
-        self.last_updated = 0
-
-    def update(self, t):
-        if t - self.last_updated >= self.period:
-            self.state = not self.state  # assuming state is boolean
-            self.last_updated = t
+    def __init__(self, state=None, period=None, rng=random):
+        self.state = state if state is not None else rng.choice(self.valid_states)
+        self.period = period if period is not None else rng.choice([3, 4, 5])
 
 class Environment(object):
     """Environment within which all agents operate."""
@@ -27,117 +26,309 @@ class Environment(object):
     valid_inputs = {'light': TrafficLight.valid_states, 'oncoming': valid_actions, 'left': valid_actions, 'right': valid_actions}
     valid_headings = [(1, 0), (0, -1), (-1, 0), (0, 1)]  # ENWS
     hard_time_limit = -100  # even if enforce_deadline is False, end trial when deadline reaches this value (to avoid deadlocks)
+    min_route_distance = 4  # a trial's start and destination are at least this many moves apart
 
-    def __init__(self, num_dummies=3, debug_traces=False):
+    def __init__(self, num_dummies=3, road_graph=None, grid_size=(8, 6), record_trace=False, seed=None,
+                 dummy_fleet=False, scenarios=None):
         self.num_dummies = num_dummies  # no. of dummy agents
+
+        # Random stream of the environment (and its dummy agents), reseeded for each trial if seed is set
+        self.seed = seed
+        self.random = make_random(seed)
+        self.trial = -1  # index of the current trial
         
         # Initialize simulation variables
         self.done = False
         self.t = 0
         self.agent_states = OrderedDict()
-        self.status_text = ""
+        self.agent_order = {}  # agent -> creation index, used to keep per-intersection lists in agent order
+        self.status = None  # (state, action, reward) of the primary agent's last move, formatted on demand
+        self.reset_trial_stats()
 
-        # Road network
-        self.grid_size = (8, 6)  # (cols, rows)
-        self.bounds = (1, 1, self.grid_size[0], self.grid_size[1])
+        # Road network: a wrap-around grid by default, or a RoadGraph (or road file to load one from)
         self.block_size = 100
         self.intersections = OrderedDict()
         self.roads = []
-        for x in xrange(self.bounds[0], self.bounds[2] + 1):
-            for y in xrange(self.bounds[1], self.bounds[3] + 1):
-                self.intersections[(x, y)] = TrafficLight()  # a traffic light at each intersection
-
-        for a in self.intersections:
-            for b in self.intersections:
-                if a == b:
-                    continue
-                if (abs(a[0] - b[0]) + abs(a[1] - b[1])) == 1:  # L1 distance = 1
-                    self.roads.append((a, b))
-
-        # Dummy agents
-        for i in xrange(self.num_dummies):
-            self.create_agent(DummyAgent)
+        self.road_graph = RoadGraph.load(road_graph) if isinstance(road_graph, basestring) else road_graph
+        if self.road_graph is None:
+            self.grid_size = tuple(grid_size)  # (cols, rows)
+            self.bounds = (1, 1, self.grid_size[0], self.grid_size[1])
+            for x in xrange(self.bounds[0], self.bounds[2] + 1):
+                for y in xrange(self.bounds[1], self.bounds[3] + 1):
+                    self.intersections[(x, y)] = len(self.intersections)  # a traffic light at each intersection (its index)
+
+            # Roads join neighbouring intersections (L1 distance = 1), in both directions
+            neighbour_offsets = [(-1, 0), (0, -1), (0, 1), (1, 0)]  # in intersection order
+            for a in self.intersections:
+                for dx, dy in neighbour_offsets:
+                    b = (a[0] + dx, a[1] + dy)
+                    if self.bounds[0] <= b[0] <= self.bounds[2] and self.bounds[1] <= b[1] <= self.bounds[3]:
+                        self.roads.append((a, b))
+        else:
+            self.bounds = self.road_graph.bounds
+            self.grid_size = (self.bounds[2], self.bounds[3])  # used to size the GUI window
+            for intersection in self.road_graph.intersections:
+                self.intersections[intersection] = len(self.intersections)
+            self.roads = self.road_graph.roads
+        self.intersection_list = self.intersections.keys()  # for picking random locations
+        if self.max_route_distance() < self.min_route_distance:
+            raise ValueError("No start and destination are {} moves apart on this map".format(self.min_route_distance))
+
+        # Traffic lights, as arrays: each light only depends on its initial state, its period and the time (see light_states)
+        self.light_initial = np.zeros(len(self.intersections), dtype=bool)
+        self.light_period = np.zeros(len(self.intersections), dtype=int)
+        for i in xrange(len(self.intersections)):
+            traffic_light = TrafficLight(rng=self.random)
+            self.light_initial[i] = traffic_light.state
+            self.light_period[i] = traffic_light.period
+        self.light_t = 0  # time of the lights' last update
+        self.intersection_agents = dict((intersection, []) for intersection in self.intersections)  # agents at each intersection
+
+        # Dummy agents: DummyAgent objects, or a DummyFleet moving all of them at once (for heavy traffic)
+        self.fleet = DummyFleet(self, self.num_dummies) if dummy_fleet else None
+        if self.fleet is None:
+            for i in xrange(self.num_dummies):
+                self.create_agent(DummyAgent)
 
         # Primary agent and associated parameters
         self.primary_agent = None  # to be set explicitly
         self.enforce_deadline = False
 
-        self.debug_traces = debug_traces
+        # Learning agents besides the primary one (see add_learner), and the learning agents done with the trial
+        self.learners = []
+        self.finished = set()
+        self.pending = None  # agents still to move in a tick started by advance() (None: no tick started)
+
+        # Step-by-step record of every trial, for Simulator.replay (see EpisodeTrace)
+        self.trace = EpisodeTrace() if record_trace else None
+
+        # Pregenerated trial set-ups (a ScenarioBank, or the directory of one), read by reset() instead of drawing them
+        self.scenarios = ScenarioBank(scenarios) if isinstance(scenarios, basestring) else scenarios
+        if self.scenarios is not None:
+            self.scenarios.check(self)
+            self.light_period = np.array(self.scenarios.light_period, dtype=int)
+
 
     def create_agent(self, agent_class, *args, **kwargs):
         agent = agent_class(self, *args, **kwargs)
-        self.agent_states[agent] = {'location': random.choice(self.intersections.keys()), 'heading': (0, 1)}
+        self.agent_states[agent] = {'location': self.random.choice(self.intersection_list), 'heading': (0, 1)}
+        self.place_agent(agent, self.agent_states[agent]['location'])
         return agent
 
     def set_primary_agent(self, agent, enforce_deadline=False):
         self.primary_agent = agent
-        self.agent_states[agent] = {'location': random.choice(self.intersections.keys()), 'heading': (0, 1)}
+        if agent in self.agent_states:
+            self.remove_agent(agent, self.agent_states[agent]['location'])
+        self.agent_states[agent] = {'location': self.random.choice(self.intersection_list), 'heading': (0, 1)}
+        self.place_agent(agent, self.agent_states[agent]['location'])
         self.enforce_deadline = enforce_deadline
 
+    def add_learner(self, agent):
+        """Add a learning agent besides the primary one (e.g. a QLearningAgent sharing the primary's Q-table).
+
+        Like the primary agent, each learner gets its own start, destination and deadline every trial, and a reward
+        bonus and a stats row when it arrives or runs out of time; it then leaves the road. The trial is done when
+        every learning agent is. Learners' routes are always drawn at random, even with a scenario bank.
+        """
+        if agent in self.agent_states:
+            self.remove_agent(agent, self.agent_states[agent]['location'])
+        self.agent_states[agent] = {'location': self.random.choice(self.intersection_list), 'heading': (0, 1)}
+        self.place_agent(agent, self.agent_states[agent]['location'])
+        self.learners.append(agent)
+
     def plot_primary_agent_stats(self):
         self.primary_agent.stats_plot()
 
-    def reset(self):
+    def place_agent(self, agent, location):
+        """Add agent to the index of agents at location, keeping it in agent creation order."""
+        order = self.agent_order.setdefault(agent, len(self.agent_order))
+        agents = self.intersection_agents[location]
+        agents.append(agent)
+        if len(agents) > 1 and self.agent_order[agents[-2]] > order:
+            agents.sort(key=self.agent_order.get)
+
+    def remove_agent(self, agent, location):
+        """Remove agent from the index of agents at location."""
+        self.intersection_agents[location].remove(agent)
+
+    def checkpoint_state(self):
+        """State carried over from one trial to the next, for checkpoint.save (taken between trials)."""
+        return {
+            'trial': self.trial,
+            'random': self.random.getstate(),
+            'light_initial': self.light_states(),
+            'light_period': self.light_period,
+            'agents': [(agent.color, agent.next_waypoint) for agent in self.agent_states],
+            'fleet': self.fleet.checkpoint_state() if self.fleet is not None else None,
+        }
+
+    def restore_checkpoint_state(self, state):
+        self.trial = state['trial']
+        self.random.setstate(state['random'])
+        self.light_initial = state['light_initial']
+        self.light_period = state['light_period']
+        self.light_t = 0
+        for agent, (color, next_waypoint) in zip(self.agent_states, state['agents']):
+            agent.color = color
+            agent.next_waypoint = next_waypoint
+        if self.fleet is not None:
+            self.fleet.restore_checkpoint_state(state['fleet'])
+
+    def reset_trial_stats(self):
+        """Clear the per-trial outcome of the primary agent (read by Simulator after each trial)."""
+        self.trial_success = False
+        self.trial_steps = 0
+        self.trial_reward = 0.0
+        self.trial_violations = 0
+
+    def reset(self, trial=None):
+        """Set up the next trial (or the given one).
+
+        With a seed, the environment and every seeded agent draw from streams derived from (seed, trial), so any
+        trial can be re-run on its own, given the same agents: e.g. env.reset(trial=42) to replay trial 42.
+        """
+        self.trial = self.trial + 1 if trial is None else trial
+        if self.seed is not None:
+            self.random.seed(derive_seed(self.seed, self.trial))
+        for agent in self.agent_states.iterkeys():
+            if agent.seed is not None:
+                agent.random.seed(derive_seed(agent.seed, self.trial))
+
         self.done = False
+        self.finished.clear()
+        self.pending = None
         self.t = 0
-
-        # Reset traffic lights
-        for traffic_light in self.intersections.itervalues():
-            traffic_light.reset()
-
-        # Pick a start and a destination
-        start = random.choice(self.intersections.keys())
-        destination = random.choice(self.intersections.keys())
-
-        # Ensure starting location and destination are not too close
-        while self.compute_dist(start, destination) < 4:
-            start = random.choice(self.intersections.keys())
-            destination = random.choice(self.intersections.keys())
-
-        start_heading = random.choice(self.valid_headings)
-        deadline = self.compute_dist(start, destination) * 5
-        # print "Environment.reset(): Trial set up with start = {}, destination = {}, deadline = {}".format(start, destination, deadline)
+        self.reset_trial_stats()
+
+        # Reset traffic lights, and pick a start and a destination: from the scenario bank, or at random
+        scenario = self.scenarios.scenario(self.trial) if self.scenarios is not None else None
+        if scenario is not None:
+            self.light_initial = np.array(scenario['light_initial'])
+            start = self.intersection_list[scenario['start']]
+            destination = self.intersection_list[scenario['destination']]
+            start_heading = self.valid_headings[scenario['heading']]
+            deadline = int(scenario['deadline'])
+        else:
+            if self.seed is not None:
+                # Independent of past trials; drawn light by light, in intersection order, as the lights always were
+                self.light_initial = np.array([self.random.choice(TrafficLight.valid_states) for _ in self.intersection_list])
+            else:
+                self.light_initial = self.light_states()  # lights carry on from the last trial
+            start, destination, start_heading, deadline = self.random_route()
+        self.light_t = 0
+        simlog.logger.debug("Environment.reset(): Trial set up with start = %s, destination = %s, deadline = %s", start, destination, deadline)
+        simlog.trial_started()
 
         # Initialize agent(s)
+        placements = None  # (location, heading) of each dummy, from the scenario bank
+        if scenario is not None:
+            n_dummies = self.fleet.n if self.fleet is not None else len(self.agent_states) - (self.primary_agent in self.agent_states) - len(self.learners)
+            if n_dummies != self.scenarios.n_dummies:
+                raise ValueError("Scenario bank {} has {} dummies, the environment {}".format(self.scenarios.path, self.scenarios.n_dummies, n_dummies))
+            placements = (scenario['dummy_locations'], scenario['dummy_headings'])
+        if self.fleet is not None:
+            self.fleet.reset(redraw_waypoints=self.seed is not None, placements=placements)
+            placements = None
+        elif placements is not None:
+            locations, headings = [column.tolist() for column in placements]
+            placements = iter([(self.intersection_list[l], self.valid_headings[h]) for l, h in zip(locations, headings)])
+        routes = dict((learner, self.random_route()) for learner in self.learners)
+        for state in self.agent_states.itervalues():
+            del self.intersection_agents[state['location']][:]
         for agent in self.agent_states.iterkeys():
+            agent_destination, agent_deadline = None, None
+            if agent is self.primary_agent:
+                location, heading, agent_destination, agent_deadline = start, start_heading, destination, deadline
+            elif agent in routes:
+                location, agent_destination, heading, agent_deadline = routes[agent]
+            elif placements is not None:
+                location, heading = next(placements)
+            else:
+                location, heading = self.random.choice(self.intersection_list), self.random.choice(self.valid_headings)
             self.agent_states[agent] = {
-                'location': start if agent is self.primary_agent else random.choice(self.intersections.keys()),
-                'heading': start_heading if agent is self.primary_agent else random.choice(self.valid_headings),
-                'destination': destination if agent is self.primary_agent else None,
-                'deadline': deadline if agent is self.primary_agent else None}
-            agent.reset(destination=(destination if agent is self.primary_agent else None))
+                'location': location,
+                'heading': heading,
+                'destination': agent_destination,
+                'deadline': agent_deadline}
+            self.place_agent(agent, location)
+            agent.reset(destination=agent_destination)
+
+        if self.trace is not None:
+            self.trace.start_trial(self)
+
+    def random_route(self):
+        """(start, destination, start heading, deadline) of a learning agent, drawn at random."""
+        # Pick a start and a destination
+        start = self.random.choice(self.intersection_list)
+        destination = self.random.choice(self.intersection_list)
+
+        # Ensure starting location and destination are not too close (some are far enough, see __init__)
+        while self.compute_dist(start, destination) < self.min_route_distance:
+            start = self.random.choice(self.intersection_list)
+            destination = self.random.choice(self.intersection_list)
+
+        start_heading = self.random.choice(self.valid_headings)
+        return start, destination, start_heading, self.compute_dist(start, destination) * 5
+
+    def finish(self, agent, success):
+        """End the trial of a learning agent; the trial is done once every learning agent's is."""
+        self.finished.add(agent)
+        agent.stats_by_simulation_add_row(success)
+        if len(self.finished) == len(self.learners) + (self.primary_agent is not None):
+            self.done = True
+        else:
+            self.remove_agent(agent, self.agent_states[agent]['location'])  # leaves the road to the others
+
+    def advance(self):
+        """Start the next tick, up to the primary agent's move: update the lights and move every agent that moves
+        before it. sense() then returns what the primary agent will act on in step(), which finishes the tick."""
+        # Update traffic lights (computed on demand from light_t)
+        self.light_t = self.t
+
+        # Update agents, in agent order (the fleet's dummies first)
+        if self.fleet is not None:
+            self.fleet.update()
+        agents = self.agent_states.keys()
+        self.pending = agents[agents.index(self.primary_agent):] if self.primary_agent in self.agent_states else []
+        for agent in agents[:len(agents) - len(self.pending)]:
+            if agent not in self.finished:
+                agent.update(self.t)
 
     def step(self):
         #print "Environment.step(): t = {}".format(self.t)  # [debug]
 
-        # Update traffic lights
-        for intersection, traffic_light in self.intersections.iteritems():
-            traffic_light.update(self.t)
+        if self.pending is None:
+            self.advance()
+        agents, self.pending = self.pending, None
+        for agent in agents:
+            if agent not in self.finished:
+                agent.update(self.t)
 
-        # Update agents
-        for agent in self.agent_states.iterkeys():
-            agent.update(self.t)
+        if self.trace is not None:
+            self.trace.record_step(self)
 
         if self.done:
-            return  # primary agent might have reached destination
+            return  # every learning agent might have reached its destination
 
-        if self.primary_agent is not None:
-            agent_deadline = self.agent_states[self.primary_agent]['deadline']
+        for agent in ([self.primary_agent] if self.primary_agent is not None else []) + self.learners:
+            if agent in self.finished:
+                continue
+            agent_deadline = self.agent_states[agent]['deadline']
             if agent_deadline <= self.hard_time_limit:
-                self.done = True
-                if self.debug_traces:
-                    print "\t*** Environment.step(): Primary agent hit hard time limit ({})! Trial aborted. ***".format(self.hard_time_limit)
-                self.primary_agent.stats_by_simulation_add_row(False)
+                if agent is self.primary_agent:
+                    simlog.logger.info("\t*** Environment.step(): Primary agent hit hard time limit (%s)! Trial aborted. ***", self.hard_time_limit)
+                    simlog.trial_failed()
+                self.finish(agent, False)
             elif self.enforce_deadline and agent_deadline <= 0:
-                self.done = True
-                if self.debug_traces:
-                    print "\t*** Environment.step(): Primary agent ran out of time! Trial aborted. ***"
-                self.primary_agent.stats_by_simulation_add_row(False)
+                if agent is self.primary_agent:
+                    simlog.logger.info("\t*** Environment.step(): Primary agent ran out of time! Trial aborted. ***")
+                    simlog.trial_failed()
+                self.finish(agent, False)
                 # self.primary_agent.stats_save_to_file()
 
                 # print "LearningAgent stats: q_values_count = {}, reward_cum = {}".format(0,
                 #                                                                          self.primary_agent.cum_reward)  # [debug]
-            self.agent_states[self.primary_agent]['deadline'] = agent_deadline - 1
+            self.agent_states[agent]['deadline'] = agent_deadline - 1
 
         self.t += 1
 
@@ -147,14 +338,29 @@ class Environment(object):
         state = self.agent_states[agent]
         location = state['location']
         heading = state['heading']
-        light = 'green' if (self.intersections[location].state and heading[1] != 0) or ((not self.intersections[location].state) and heading[0] != 0) else 'red'
+        light_state = self.light_state(location)
+        light = 'green' if (light_state and heading[1] != 0) or ((not light_state) and heading[0] != 0) else 'red'
 
-        # Populate oncoming, left, right
+        # Populate oncoming, left, right (only agents at the same intersection can be relevant)
         oncoming = None
         left = None
         right = None
-        for other_agent, other_state in self.agent_states.iteritems():
-            if agent == other_agent or location != other_state['location'] or (heading[0] == other_state['heading'][0] and heading[1] == other_state['heading'][1]):
+        if self.fleet is not None:
+            # Dummies come first in agent order (same rules as for agent objects, below)
+            for other_heading, other_waypoint in self.fleet.agents_at(location):
+                if heading == other_heading:
+                    continue
+                if (heading[0] * other_heading[0] + heading[1] * other_heading[1]) == -1:
+                    if oncoming != 'left':
+                        oncoming = other_waypoint
+                elif (heading[1] == other_heading[0] and -heading[0] == other_heading[1]):
+                    if right != 'forward' and right != 'left':
+                        right = other_waypoint
+                elif left != 'forward':
+                    left = other_waypoint
+        for other_agent in self.intersection_agents[location]:
+            other_state = self.agent_states[other_agent]
+            if agent == other_agent or (heading[0] == other_state['heading'][0] and heading[1] == other_state['heading'][1]):
                 continue
             other_heading = other_agent.get_next_waypoint()
             if (heading[0] * other_state['heading'][0] + heading[1] * other_state['heading'][1]) == -1:
@@ -170,7 +376,7 @@ class Environment(object):
         return {'light': light, 'oncoming': oncoming, 'left': left, 'right': right}
 
     def get_deadline(self, agent):
-        return self.agent_states[agent]['deadline'] if agent is self.primary_agent else None
+        return self.agent_states[agent].get('deadline')  # None for dummy agents
 
     def act(self, agent, action):
         assert agent in self.agent_states, "Unknown agent!"
@@ -179,7 +385,8 @@ class Environment(object):
         state = self.agent_states[agent]
         location = state['location']
         heading = state['heading']
-        light = 'green' if (self.intersections[location].state and heading[1] != 0) or ((not self.intersections[location].state) and heading[0] != 0) else 'red'
+        light_state = self.light_state(location)
+        light = 'green' if (light_state and heading[1] != 0) or ((not light_state) and heading[0] != 0) else 'red'
         inputs = self.sense(agent)
 
         # Move agent if within bounds and obeys traffic rules
@@ -199,13 +406,18 @@ class Environment(object):
             else:
                 move_okay = False
 
+        if move_okay and action is not None:
+            next_location = self.next_location(location, heading)
+            if next_location is None:
+                move_okay = False  # no road that way
+
         if move_okay:
             # Valid move (could be null)
             if action is not None:
                 # Valid non-null move
-                location = ((location[0] + heading[0] - self.bounds[0]) % (self.bounds[2] - self.bounds[0] + 1) + self.bounds[0],
-                            (location[1] + heading[1] - self.bounds[1]) % (self.bounds[3] - self.bounds[1] + 1) + self.bounds[1])  # wrap-around
-                #if self.bounds[0] <= location[0] <= self.bounds[2] and self.bounds[1] <= location[1] <= self.bounds[3]:  # bounded
+                location = next_location
+                self.remove_agent(agent, state['location'])
+                self.place_agent(agent, location)
                 state['location'] = location
                 state['heading'] = heading
                 reward = 2.0 if action == agent.get_next_waypoint() else -0.5  # valid, but is it correct? (as per waypoint)
@@ -217,18 +429,55 @@ class Environment(object):
             reward = -1.0
 
         if agent is self.primary_agent:
-            if state['location'] == state['destination']:
-                if state['deadline'] >= 0:
-                    reward += 10  # bonus
-                self.done = True
-                if self.debug_traces:
-                    print "\t*** Environment.act(): Primary agent has reached destination! ***" # [debug]
-                self.primary_agent.stats_by_simulation_add_row(True)
-            self.status_text = "state: {}\naction: {}\nreward: {}".format(agent.get_state(), action, reward)
+            self.trial_steps += 1
+            if not move_okay:
+                self.trial_violations += 1
+        if state.get('destination') is not None and state['location'] == state['destination']:  # a learning agent arrived
+            on_time = state['deadline'] >= 0  # late arrivals (enforce_deadline=False) get no bonus and are no success
+            if on_time:
+                reward += 10  # bonus
+            if agent is self.primary_agent:
+                self.trial_success = on_time
+                simlog.logger.info("\t*** Environment.act(): Primary agent has reached destination! ***")  # [debug]
+            self.finish(agent, on_time)
+        if agent is self.primary_agent:
+            self.status = (agent.get_state(), action, reward)
             #print "Environment.act() [POST]: location: {}, heading: {}, action: {}, reward: {}".format(location, heading, action, reward)  # [debug]
+            self.trial_reward += reward
 
         return reward
 
+    def light_state(self, location):
+        """State of the traffic light at location: True if North-South is open, False if East-West is open."""
+        i = self.intersections[location]
+        return self.light_initial.item(i) != (self.light_t // self.light_period.item(i)) % 2
+
+    def light_states(self):
+        """States of all traffic lights, in intersection order.
+
+        A light flips every period steps, from its initial state at the start of the trial.
+        """
+        return self.light_initial ^ ((self.light_t // self.light_period) % 2).astype(bool)
+
+    def next_location(self, location, heading):
+        """Intersection reached by driving one block from location along heading (None if there is no road)."""
+        if self.road_graph is not None:
+            return self.road_graph.neighbour(location, heading)
+        return ((location[0] + heading[0] - self.bounds[0]) % (self.bounds[2] - self.bounds[0] + 1) + self.bounds[0],
+                (location[1] + heading[1] - self.bounds[1]) % (self.bounds[3] - self.bounds[1] + 1) + self.bounds[1])  # wrap-around
+
+    @property
+    def status_text(self):
+        return "state: {}\naction: {}\nreward: {}".format(*self.status) if self.status is not None else ""
+
+    def max_route_distance(self):
+        """Largest compute_dist() between two intersections (-1 if none can be reached from another)."""
+        if self.road_graph is not None:
+            return int(self.road_graph.distances.max())
+        return (self.bounds[2] - self.bounds[0]) + (self.bounds[3] - self.bounds[1])
+
     def compute_dist(self, a, b):
-        """L1 distance between two points."""
+        """L1 distance between two points (no. of moves on a shortest route, for a road graph)."""
+        if self.road_graph is not None:
+            return self.road_graph.distance(a, b)
         return abs(b[0] - a[0]) + abs(b[1] - a[1])
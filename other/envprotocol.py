@@ -0,0 +1,46 @@
+import struct
+
+# Binary protocol between EnvironmentServer and EnvironmentClient, over a stream socket (Unix or TCP).
+# Every message, both ways, is a header followed by `count` fixed-size records: a request carries one command
+# per record, possibly for as many environments, and its reply carries one result record per command, in order.
+header = struct.Struct('<IH')  # length of the rest of the message (in bytes), no. of records
+request = struct.Struct('<BIi')  # command, environment id (CREATE: seed), argument (CREATE: no. of dummies; ACT, STEP: action)
+reply = struct.Struct('<IBBfhBBBBB')  # environment id, status, done, reward, deadline, light, oncoming, left, right, next waypoint
+
+# Commands
+CREATE, RESET, SENSE, ACT, STEP, CLOSE = range(6)
+command_names = ['CREATE', 'RESET', 'SENSE', 'ACT', 'STEP', 'CLOSE']
+
+# Status of a result
+OK, ERROR = 0, 1
+
+no_seed = 0xFFFFFFFF  # environment id of a CREATE without seed
+actions = [None, 'forward', 'left', 'right']  # action codes (also for oncoming, left, right and next waypoint)
+action_codes = dict((action, i) for i, action in enumerate(actions))
+lights = ['red', 'green']  # light codes
+light_codes = dict((light, i) for i, light in enumerate(lights))
+
+
+def encode(record_struct, records):
+    """One message holding the given records (tuples of record_struct's fields)."""
+    body = ''.join(record_struct.pack(*record) for record in records)
+    return header.pack(len(body) + header.size - 4, len(records)) + body
+
+
+def decode(record_struct, message):
+    """Records of a message (without its length field, as returned by split())."""
+    count, = struct.unpack_from('<H', message)
+    return [record_struct.unpack_from(message, 2 + i * record_struct.size) for i in xrange(count)]
+
+
+def split(buffer):
+    """Complete messages at the start of buffer (each without its length field), and the rest of buffer."""
+    messages = []
+    offset = 0
+    while len(buffer) - offset >= 4:
+        length, = struct.unpack_from('<I', buffer, offset)
+        if len(buffer) - offset - 4 < length:
+            break
+        messages.append(buffer[offset + 4:offset + 4 + length])
+        offset += 4 + length
+    return messages, buffer[offset:]
@@ -0,0 +1,190 @@
+import argparse
+import asyncore
+import os
+import socket
+
+import envprotocol
+import simlog
+from agents import ExternalAgent
+from batchenv import observation
+from environment import Environment
+
+
+class EnvironmentServer(asyncore.dispatcher):
+    """Hosts Environments, each with an ExternalAgent as primary agent, for clients speaking envprotocol.
+
+    A single-threaded event loop (asyncore over poll()) serves every connection: commands are cheap compared to
+    a round-trip, so clients should batch them (e.g. a STEP for each of their environments in one message).
+    Environments belong to the connection that created them, and are closed with it.
+    """
+
+    # Limits on what one client can allocate: a CREATE going over them gets an ERROR reply
+    max_dummies = 1000  # per environment
+    max_environments = 10000  # per connection
+
+    def __init__(self, address, backlog=1024):
+        asyncore.dispatcher.__init__(self, map={})
+        self.address = address
+        if isinstance(address, basestring):  # Unix socket path
+            if os.path.exists(address):
+                os.remove(address)
+            self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.set_reuse_addr()
+        self.bind(address)
+        self.listen(backlog)
+        self.environments = {}  # id -> (environment, its ExternalAgent, owning connection)
+        self.next_id = 0
+
+    def serve_forever(self):
+        try:
+            asyncore.loop(use_poll=True, map=self._map)
+        finally:
+            self.close_all()
+
+    def close_all(self):
+        asyncore.close_all(map=self._map)
+        if isinstance(self.address, basestring) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            sock, address = pair
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # replies are small: send them right away
+            ClientConnection(sock, self)
+
+    def execute(self, connection, command, env_id, argument):
+        """Run one command for connection; returns its reply record (with ERROR status if the command failed)."""
+        try:
+            return self.run_command(connection, command, env_id, argument)
+        except Exception as e:
+            simlog.logger.warning("EnvironmentServer: %s failed for environment %s (%s: %s)",
+                                  envprotocol.command_names[command] if command < len(envprotocol.command_names) else command,
+                                  env_id, e.__class__.__name__, e)
+            return self.error(env_id)
+
+    def run_command(self, connection, command, env_id, argument):
+        if command == envprotocol.CREATE:
+            if not 0 <= argument <= self.max_dummies:
+                raise ValueError("no. of dummies must be in [0, {}], got {}".format(self.max_dummies, argument))
+            if len(connection.environments) >= self.max_environments:
+                raise ValueError("connection already has {} environments".format(self.max_environments))
+            env = Environment(num_dummies=argument, seed=env_id if env_id != envprotocol.no_seed else None)
+            agent = env.create_agent(ExternalAgent)
+            env.set_primary_agent(agent, enforce_deadline=True)
+            env_id = self.next_id
+            self.next_id += 1
+            self.environments[env_id] = (env, agent, connection)
+            connection.environments.add(env_id)
+            return self.observe(env_id, env, agent, 0.0)
+
+        entry = self.environments.get(env_id)
+        if entry is None or entry[2] is not connection:
+            return self.error(env_id)
+        env, agent = entry[:2]
+        if command == envprotocol.RESET:
+            env.reset()
+            env.advance()  # observations are what the agent will act on
+            return self.observe(env_id, env, agent, 0.0)
+        elif command == envprotocol.SENSE:
+            return self.observe(env_id, env, agent, 0.0)
+        elif command in (envprotocol.ACT, envprotocol.STEP):
+            if not 0 <= argument < len(envprotocol.actions):
+                return self.error(env_id)
+            if command == envprotocol.ACT:  # move the agent only, the rest of the world stays still
+                agent.next_waypoint = agent.planner.next_waypoint()
+                reward = env.act(agent, envprotocol.actions[argument])
+            else:
+                agent.action = envprotocol.actions[argument]
+                agent.reward = 0.0
+                env.step()
+                reward = agent.reward
+                if not env.done:
+                    env.advance()  # sense the next tick's lights and traffic, which the agent acts on
+            return self.observe(env_id, env, agent, reward)
+        elif command == envprotocol.CLOSE:
+            del self.environments[env_id]
+            connection.environments.discard(env_id)
+            return (env_id, envprotocol.OK, 1, 0.0, 0, 0, 0, 0, 0, 0)
+        return self.error(env_id)
+
+    def observe(self, env_id, env, agent, reward):
+        """Reply record with what the agent senses after a command, and the reward it got."""
+        if env.trial < 0:  # not reset yet: nothing to sense
+            return (env_id, envprotocol.OK, 1, reward, 0, 0, 0, 0, 0, 0)
+        light, oncoming, left, right, next_waypoint, deadline = observation(env, agent)
+        return (env_id, envprotocol.OK, env.done, reward, deadline, light, oncoming, left, right, next_waypoint)
+
+    def error(self, env_id):
+        return (env_id, envprotocol.ERROR, 0, 0.0, 0, 0, 0, 0, 0, 0)
+
+    def disconnected(self, connection):
+        for env_id in connection.environments:
+            del self.environments[env_id]
+        connection.environments.clear()
+
+
+class ClientConnection(asyncore.dispatcher):
+    """One client of an EnvironmentServer: reads request messages, and queues a reply message for each of them."""
+
+    read_size = 65536
+
+    def __init__(self, sock, server):
+        asyncore.dispatcher.__init__(self, sock, map=server._map)
+        self.server = server
+        self.environments = set()  # ids of the environments this client created
+        self.in_buffer = ''
+        self.out_buffer = []
+
+    def handle_read(self):
+        data = self.recv(self.read_size)
+        if not data:
+            return
+        messages, self.in_buffer = envprotocol.split(self.in_buffer + data)
+        for message in messages:
+            try:
+                requests = envprotocol.decode(envprotocol.request, message)
+                if len(message) != 2 + len(requests) * envprotocol.request.size:
+                    raise ValueError("length does not match the no. of records")
+            except Exception as e:
+                simlog.logger.warning("EnvironmentServer: malformed message (%s); closing connection", e)
+                self.handle_close()
+                return
+            self.out_buffer.append(envprotocol.encode(envprotocol.reply, [self.server.execute(self, *request) for request in requests]))
+        if self.out_buffer:
+            self.handle_write()  # most replies fit in the socket buffer: no need to wait for the next poll()
+
+    def writable(self):
+        return bool(self.out_buffer)
+
+    def handle_write(self):
+        data = ''.join(self.out_buffer)
+        sent = self.send(data)
+        self.out_buffer = [data[sent:]] if sent < len(data) else []
+
+    def handle_close(self):
+        self.server.disconnected(self)
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve smartcab environments to agents in other processes (see envclient).")
+    parser.add_argument('--unix', help="Unix socket path to listen on")
+    parser.add_argument('--tcp', help="host:port to listen on (default: 127.0.0.1:5555, unless --unix)")
+    args = parser.parse_args()
+
+    if args.unix:
+        address = args.unix
+    else:
+        host, port = (args.tcp or '127.0.0.1:5555').rsplit(':', 1)
+        address = (host, int(port))
+    server = EnvironmentServer(address)
+    print "Serving environments on {}".format(address)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import array
+import numpy as np
+
+headings = [(1, 0), (0, -1), (-1, 0), (0, 1)]  # ENWS, same order as Environment.valid_headings
+actions = [None, 'forward', 'left', 'right']  # same order as Environment.valid_actions
+heading_codes = dict((heading, i) for i, heading in enumerate(headings))
+action_codes = dict((action, i) for i, action in enumerate(actions))
+
+
+class EpisodeTrace(object):
+    """Step-by-step record of trials, stored column by column in compact binary arrays.
+
+    Each step holds every agent's location, heading and next waypoint, the state of every traffic light,
+    and the primary agent's action, reward and deadline. Filled in by an Environment created with
+    record_trace=True; Simulator.replay plays it back without running the agents (or any learning).
+    """
+
+    def __init__(self):
+        self.intersections = None  # (V, 2) coordinates, in Environment.intersections order
+        self.roads = None  # (R, 2, 2) road end points
+        self.colors = None  # agent colors, in Environment.agent_states order
+        self.primary = -1  # agent column of the primary agent (-1: none)
+        self.index = None  # intersection -> column in the light arrays (while recording)
+        self.n_steps = 0
+        self._arrays = None  # numpy columns, built from the buffers on demand (or loaded from a file)
+        self._buffers = None
+
+    def start_trial(self, env):
+        """Begin a new trial, recording the state Environment.reset() left env in as its first step."""
+        if self._buffers is None:
+            self._start_recording(env)
+        state = env.agent_states[env.primary_agent] if env.primary_agent is not None else {}
+        self._buffers['trial_offsets'].append(self.n_steps)
+        self._buffers['destinations'].append(self.index[state['destination']] if state.get('destination') is not None else -1)
+        self.record_step(env, None, 0.0)
+
+    def record_step(self, env, action=None, reward=None):
+        """Append the current state of env; action and reward default to the primary agent's last move."""
+        if action is None and reward is None and env.status is not None:
+            _, action, reward = env.status
+        buffers = self._buffers
+        index = self.index
+        if env.fleet is not None:
+            buffers['locations'].fromstring(env.fleet.location.astype(buffers['locations'].typecode).tostring())
+            buffers['headings'].fromstring(env.fleet.heading.astype(np.int8).tostring())
+            buffers['waypoints'].fromstring(env.fleet.waypoint.astype(np.int8).tostring())
+        for agent, state in env.agent_states.iteritems():
+            buffers['locations'].append(index[state['location']])
+            buffers['headings'].append(heading_codes[state['heading']])
+            buffers['waypoints'].append(action_codes[agent.get_next_waypoint()])
+        buffers['lights'].fromstring(env.light_states().astype(np.int8).tostring())
+        buffers['actions'].append(action_codes[action])
+        buffers['rewards'].append(reward if reward is not None else 0.0)
+        deadline = env.get_deadline(env.primary_agent) if env.primary_agent is not None else None
+        buffers['deadlines'].append(deadline if deadline is not None else 0)
+        self.n_steps += 1
+
+    def _start_recording(self, env):
+        self.intersections = np.array(env.intersections.keys(), dtype=np.int32)
+        self.roads = np.array(env.roads, dtype=np.int32).reshape(-1, 2, 2)
+        fleet_colors = env.fleet.colors if env.fleet is not None else []  # fleet dummies come first
+        self.colors = fleet_colors + [agent.color for agent in env.agent_states]
+        self.primary = len(fleet_colors) + env.agent_states.keys().index(env.primary_agent) if env.primary_agent in env.agent_states else -1
+        self.index = dict((intersection, i) for i, intersection in enumerate(env.intersections))
+        location_type = 'h' if len(self.index) < 2 ** 15 else 'i'  # int16 unless the map is huge
+        self._buffers = {
+            'trial_offsets': array.array('i'),
+            'destinations': array.array(location_type),
+            'locations': array.array(location_type),
+            'headings': array.array('b'),
+            'waypoints': array.array('b'),
+            'lights': array.array('b'),
+            'actions': array.array('b'),
+            'rewards': array.array('f'),
+            'deadlines': array.array('h'),
+        }
+
+    @property
+    def n_trials(self):
+        return len(self.arrays()['destinations'])
+
+    def map_size(self, block_size):
+        """(width, height) in pixels of a Simulator window showing the recorded map, as sized for its Environment."""
+        corners = np.concatenate([self.intersections, self.roads.reshape(-1, 2)])
+        return tuple(((corners.max(axis=0) + 1) * block_size).tolist())
+
+    def trial_steps(self, trial):
+        """Range of step indices of the given trial."""
+        offsets = self.arrays()['trial_offsets']
+        return xrange(offsets[trial], offsets[trial + 1])
+
+    def arrays(self):
+        """Columns as numpy arrays: per-step (S, A) agent and (S, V) light columns, and per-trial columns."""
+        if self._buffers is None and self._arrays is None:
+            raise ValueError("Empty trace: no trial has been recorded")
+        if self._arrays is None or (self._buffers is not None and len(self._arrays['actions']) != self.n_steps):
+            n_agents = len(self.colors)
+            columns = dict((name, np.frombuffer(buffer, dtype=buffer.typecode).copy()) for name, buffer in self._buffers.iteritems())
+            columns['trial_offsets'] = np.append(columns['trial_offsets'], self.n_steps)
+            for name in ['locations', 'headings', 'waypoints']:
+                columns[name] = columns[name].reshape(-1, n_agents)
+            columns['lights'] = columns['lights'].reshape(-1, len(self.intersections)).astype(bool)
+            self._arrays = columns
+        return self._arrays
+
+    def save(self, filename):
+        """Write the trace to a compressed .npz file (light states are bit-packed)."""
+        columns = dict(self.arrays())
+        columns['lights'] = np.packbits(columns['lights'], axis=1)
+        np.savez_compressed(filename, intersections=self.intersections, roads=self.roads, colors=np.array(self.colors),
+                            primary=self.primary, n_lights=len(self.intersections), **columns)
+
+    @classmethod
+    def load(cls, filename):
+        """Read a trace written by save()."""
+        trace = cls()
+        data = np.load(filename)
+        trace.intersections = data['intersections']
+        trace.roads = data['roads']
+        trace.colors = [str(color) for color in data['colors']]
+        trace.primary = int(data['primary'])
+        columns = dict((name, data[name]) for name in data.files if name not in ('intersections', 'roads', 'colors', 'primary', 'n_lights'))
+        columns['lights'] = np.unpackbits(columns['lights'], axis=1)[:, :int(data['n_lights'])].astype(bool)
+        trace.n_steps = len(columns['actions'])
+        trace._arrays = columns
+        return trace
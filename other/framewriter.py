@@ -0,0 +1,64 @@
+import distutils.spawn
+import os
+import subprocess
+
+video_extensions = ['.mp4', '.avi', '.mkv', '.mov', '.webm', '.gif']
+
+
+def open_writer(pygame, path, size, fps):
+    """Frame writer for path: a video file (by extension, see video_extensions), or else a pattern of image files
+    numbered by frame, e.g. 'frames/frame-{:05d}.png'."""
+    if os.path.splitext(path)[1].lower() in video_extensions:
+        return FfmpegWriter(pygame, path, size, fps)
+    return ImageSequenceWriter(pygame, path)
+
+
+class ImageSequenceWriter(object):
+    """Saves each frame to its own image file, named by pattern.format(frame no.).
+
+    The format follows the extension: BMP and TGA are the fastest to write, PNG the smallest.
+    """
+
+    def __init__(self, pygame, pattern):
+        if pattern.format(0) == pattern.format(1):
+            raise ValueError("Image file pattern {} has no field for the frame no. (e.g. 'frame-{{:05d}}.png')".format(pattern))
+        directory = os.path.dirname(pattern)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.pygame = pygame
+        self.pattern = pattern
+        self.n_frames = 0
+
+    def write(self, surface):
+        self.pygame.image.save(surface, self.pattern.format(self.n_frames))
+        self.n_frames += 1
+
+    def close(self):
+        pass
+
+
+class FfmpegWriter(object):
+    """Pipes raw RGB frames to an ffmpeg process, which encodes them into a video file (ffmpeg must be on the PATH)."""
+
+    def __init__(self, pygame, filename, size, fps):
+        ffmpeg = distutils.spawn.find_executable('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError("ffmpeg not found: it is needed to write {} (image sequences, e.g. 'frames/frame-{{:05d}}.png', "
+                               "need nothing else)".format(filename))
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '{}x{}'.format(*size),
+                   '-r', str(fps), '-i', '-']
+        if not filename.lower().endswith('.gif'):
+            command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p']  # most players need even sizes and yuv420p
+        self.pygame = pygame
+        self.filename = filename
+        self.process = subprocess.Popen(command + [filename], stdin=subprocess.PIPE)
+        self.n_frames = 0
+
+    def write(self, surface):
+        self.process.stdin.write(self.pygame.image.tostring(surface, 'RGB'))
+        self.n_frames += 1
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError("ffmpeg failed writing {} (exit status {})".format(self.filename, self.process.returncode))
@@ -0,0 +1,34 @@
+import time
+import pandas as pd
+
+from environment import Environment
+from agents import QLearningAgent
+
+# Environment construction and reset() time by grid size, up to 10^5 intersections
+grid_sizes = [(8, 6), (32, 32), (100, 100), (200, 200), (316, 316)]
+n_resets = 20
+
+rows = []
+for grid_size in grid_sizes:
+    start = time.time()
+    environment = Environment(grid_size=grid_size)
+    environment.set_primary_agent(QLearningAgent(environment), enforce_deadline=True)
+    construction_time = time.time() - start
+
+    start = time.time()
+    for i in xrange(n_resets):
+        environment.reset()
+    reset_time = (time.time() - start) / n_resets
+
+    rows.append({
+        'grid_size': '{}x{}'.format(*grid_size),
+        'intersections': len(environment.intersections),
+        'roads': len(environment.roads),
+        'construction_secs': construction_time,
+        'reset_secs': reset_time,
+    })
+    print "{}x{}: construction {:.3f}s, reset {:.5f}s".format(grid_size[0], grid_size[1], construction_time, reset_time)
+
+df = pd.DataFrame(data=rows, columns=['grid_size', 'intersections', 'roads', 'construction_secs', 'reset_secs'])
+print df
+df.to_csv('benchmark_grid_size.csv')
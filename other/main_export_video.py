@@ -0,0 +1,11 @@
+import sys
+from simulator import Simulator
+from environment import Environment
+from episodetrace import EpisodeTrace
+
+# Export a trace saved by main_qlearn_agent_tuned.py to a video (needs ffmpeg) or to image files, with no window:
+# python main_export_video.py <trace file> <output, e.g. trials.mp4 or frames/frame-{:05d}.png> [trial ...]
+trace = EpisodeTrace.load(sys.argv[1])
+environment = Environment()
+simulator = Simulator(environment, size=trace.map_size(environment.block_size), offscreen=True)  # the trace's map, not the default one
+simulator.export_trace(trace, sys.argv[2], trials=[int(trial) for trial in sys.argv[3:]] or None)
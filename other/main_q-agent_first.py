@@ -2,7 +2,7 @@ from simulator import Simulator
 from environment import Environment
 from agents import QLearningAgent
 
-environment = Environment(debug_traces=False)
+environment = Environment()
 
 qlearn_agent = QLearningAgent(environment)
 
@@ -0,0 +1,36 @@
+from simulator import Simulator
+from environment import Environment
+from agents import QLearningAgent
+
+# Tuned agent, learning as it drives vs. with experience replay, over the same trials. Replay always learns each
+# reward for the action that got it (align_rewards), while the agent otherwise credits it to the previous action:
+# 'online, aligned' has the same update as replay without the replay, to tell the two effects apart
+n_trials = 50
+window = 10
+arms = [
+    ('online', {}),
+    ('online, aligned', {'align_rewards': True}),
+    ('replay', {'replay_capacity': 1000, 'replay_batch_size': 32, 'replay_period': 32}),
+]
+
+for label, replay_params in arms:
+    environment = Environment(seed=0)
+
+    qlearn_agent = environment.create_agent(
+        QLearningAgent,
+        alpha_rate=0.5,
+        epsilon_rate=0.0,
+        gamma_rate=0.5,
+        q_init_value=0.0,
+        seed=0,
+        **replay_params
+    )
+
+    environment.set_primary_agent(qlearn_agent, enforce_deadline=True)
+
+    simulator = Simulator(environment, update_delay=0, display=False)
+    simulator.run(n_trials=n_trials)
+
+    success = qlearn_agent.trial_stats.rows['success']
+    print "{}: success % by {} trials: {}".format(
+        label, window, [int(success[i:i + window].mean() * 100) for i in xrange(0, n_trials, window)])
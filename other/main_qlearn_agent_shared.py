@@ -0,0 +1,30 @@
+import numpy as np
+from simulator import Simulator
+from environment import Environment
+from agents import QLearningAgent
+
+# Tuned agent, alone vs. with more learning cars sharing its Q-table in the same world (K times the experience per step)
+n_trials = 30
+n_seeds = 30
+window = 10
+tuned_params = {'alpha_rate': 0.5, 'epsilon_rate': 0.0, 'gamma_rate': 0.5, 'q_init_value': 0.0}
+
+for n_learners in [1, 4]:
+    success = np.zeros(n_trials)
+    for seed in xrange(n_seeds):
+        environment = Environment(seed=seed)
+
+        qlearn_agent = environment.create_agent(QLearningAgent, seed=seed, **tuned_params)
+        environment.set_primary_agent(qlearn_agent, enforce_deadline=True)
+        for i in xrange(1, n_learners):
+            learner = environment.create_agent(QLearningAgent, seed=(seed, i), **tuned_params)
+            learner.share_q_table(qlearn_agent)
+            environment.add_learner(learner)
+
+        simulator = Simulator(environment, update_delay=0, display=False)
+        simulator.run(n_trials=n_trials)
+        success += qlearn_agent.trial_stats.rows['success']
+
+    success /= n_seeds
+    print "{} learner(s): success % of the primary agent by {} trials (mean of {} seeds): {}".format(
+        n_learners, window, n_seeds, [int(success[i:i + window].mean() * 100) for i in xrange(0, n_trials, window)])
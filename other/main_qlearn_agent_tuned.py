@@ -1,22 +1,26 @@
 from simulator import Simulator
 from environment import Environment
 from agents import QLearningAgent
+import simlog
 
-environment = Environment(debug_traces=True)
+simlog.configure(simlog.TRACE)  # print every step
+
+environment = Environment(record_trace=True)
 
 qlearn_agent_tuned = QLearningAgent(
     environment,
     alpha_rate=0.5,
     epsilon_rate=0.0,
     gamma_rate=0.5,
-    q_init_value=0.0,
-    debug_traces=True
+    q_init_value=0.0
 )
 
 environment.set_primary_agent(qlearn_agent_tuned, enforce_deadline=True)
 
-simulator = Simulator(environment, update_delay=0.00001, display=False, debug_traces=True)
+simulator = Simulator(environment, update_delay=0.00001, display=False)
 simulator.run(n_trials=100)
 
 df = qlearn_agent_tuned.stats_by_simulation_get_as_df()
 df.to_csv('stats_tuned_qlearn_agent.csv')
+
+environment.trace.save('trace_tuned_qlearn_agent.npz')  # replay with main_replay.py
@@ -1,27 +1,29 @@
 from simulator import Simulator
 from environment import Environment
 from agents import QLearningAgent
+import simlog
 
-environment = Environment(debug_traces=True)
+simlog.configure(simlog.TRACE)  # print every step
+
+environment = Environment()
 
 qlearn_agent_tuned = QLearningAgent(
     environment,
     alpha_rate=0.5,
     epsilon_rate=0.0,
     gamma_rate=0.5,
-    q_init_value=0.0,
-    debug_traces=True
+    q_init_value=0.0
 )
 
 environment.set_primary_agent(qlearn_agent_tuned, enforce_deadline=True)
 
-simulator = Simulator(environment, update_delay=0.5, display=True, debug_traces=True)
+simulator = Simulator(environment, update_delay=0.5, display=True)
 simulator.run(n_trials=5)
 
-simulator = Simulator(environment, update_delay=0.0000001, display=False, debug_traces=True)
-simulator.run(n_trials=90)
+simulator = Simulator(environment, display=True)
+simulator.run(n_trials=90, fps=10)  # full speed, shown 10 times per sec
 
-simulator = Simulator(environment, update_delay=1.00, display=True, debug_traces=True)
+simulator = Simulator(environment, update_delay=1.00, display=True)
 simulator.run(n_trials=5)
 #
 # df = qlearn_agent_tuned.stats_by_simulation_get_as_df()
@@ -0,0 +1,32 @@
+import os
+from environment import Environment
+from scenariobank import ScenarioBank
+from sweep import run_successive_halving
+import numpy as np
+
+# Over a 3x5x5x5 grid (375 points): 20 trials per point, then the best half of the points get twice as many
+# trials, until 300. Survivors resume from their checkpoints, so the rungs (375, 188, 94, 47 and 24 points, up to
+# 20, 40, 80, 160 and 300 trials) cost 7500 + 3760 + 3760 + 3760 + 3360 = 22140 trials: 5.1x fewer than training
+# every point for 300 trials (112500), and about as many as the 3x3x3x3 n300 sweep (24300). Trials take about
+# as many steps early in training as later on, so run times scale alike.
+n_trials = 300
+min_trials = 20
+threshold = 10
+scenarios = 'scenarios_8x6_3_dummies'  # every point faces the same trials, so fewer of them tell points apart
+
+q_init_values = [0.0, 5.0, 10]
+samples_to_generate = 5
+
+if __name__ == '__main__':
+    if not os.path.exists(scenarios):
+        ScenarioBank.generate(scenarios, Environment(num_dummies=3), n_trials, seed=0)
+    run_successive_halving(
+        {
+            'q_init_value': q_init_values,
+            'alpha_rate': np.linspace(0.00, 1.00, num=samples_to_generate),
+            'epsilon_rate': np.linspace(0.00, 1.00, num=samples_to_generate),
+            'gamma_rate': np.linspace(0.00, 1.00, num=samples_to_generate),
+        },
+        n_trials=n_trials, min_trials=min_trials, eta=2, metric='success_perc', threshold=threshold,
+        csv_path='qlearn_agent_tuning_halving.csv', seed=0, scenarios=scenarios
+    )
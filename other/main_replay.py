@@ -0,0 +1,10 @@
+import sys
+from simulator import Simulator
+from environment import Environment
+from episodetrace import EpisodeTrace
+
+# Replay a trace saved by main_qlearn_agent_tuned.py: python main_replay.py <trace file> [trial ...]
+trace = EpisodeTrace.load(sys.argv[1])
+environment = Environment()
+simulator = Simulator(environment, size=trace.map_size(environment.block_size), update_delay=0.5, display=True)  # the trace's map
+simulator.replay(trace, trials=[int(trial) for trial in sys.argv[2:]] or None)
@@ -0,0 +1,125 @@
+import collections
+import os
+import signal
+import timeit
+
+from environment import Environment
+from agents import DummyAgent, QLearningAgent
+from dummyfleet import DummyFleet
+from routeplanner import RoutePlanner
+
+# Phases of a run: (label, class, method implementing it), outermost first
+phases = [
+    ('Environment.reset', Environment, 'reset'),
+    ('Environment.step', Environment, 'step'),
+    ('DummyAgent.update', DummyAgent, 'update'),
+    ('DummyFleet.update', DummyFleet, 'update'),
+    ('QLearningAgent.update', QLearningAgent, 'update'),
+    ('Environment.sense', Environment, 'sense'),
+    ('Environment.act', Environment, 'act'),
+    ('traffic lights', Environment, 'light_state'),
+    ('traffic lights', Environment, 'light_states'),
+    ('RoutePlanner.next_waypoint', RoutePlanner, 'next_waypoint'),
+    ('QLearningAgent.choose_action', QLearningAgent, 'choose_action'),
+    ('QLearningAgent.learn', QLearningAgent, 'learn'),
+]
+
+
+class PhaseTimer(object):
+    """Accumulates wall time and call counts per phase of a run.
+
+    Works by wrapping the methods listed in `phases` between start() and stop(), so it costs nothing when not
+    running. Phases nest (e.g. sense is called from act): 'self' time excludes the time spent in inner phases.
+    """
+
+    def __init__(self):
+        self.totals = collections.OrderedDict((label, [0.0, 0.0, 0]) for label, _, _ in phases)  # label -> [total, self, calls]
+        self.stack = []  # time spent in inner phases, for each phase being timed
+        self.originals = []
+        self.elapsed = 0.0
+
+    def start(self):
+        for label, cls, name in phases:
+            original = cls.__dict__[name]
+            self.originals.append((cls, name, original))
+            setattr(cls, name, self.wrap(label, original))
+        self.stack.append(0.0)  # the run itself
+        self.start_time = timeit.default_timer()
+
+    def stop(self):
+        self.elapsed += timeit.default_timer() - self.start_time
+        self.run_inner = self.stack.pop()
+        for cls, name, original in reversed(self.originals):
+            setattr(cls, name, original)
+        self.originals = []
+
+    def wrap(self, label, function):
+        entry = self.totals[label]
+        stack = self.stack
+        clock = timeit.default_timer
+
+        def timed(*args, **kwargs):
+            stack.append(0.0)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                inner = stack.pop()
+                entry[0] += elapsed
+                entry[1] += elapsed - inner
+                entry[2] += 1
+                stack[-1] += elapsed
+        timed.__name__ = function.__name__
+        return timed
+
+    def summary(self):
+        """One row per phase that ran, plus the time of the run outside any phase (e.g. the Simulator loop)."""
+        rows = [{'phase': label, 'calls': calls, 'total_secs': total, 'self_secs': self_time}
+                for label, (total, self_time, calls) in self.totals.iteritems() if calls > 0]
+        rows.append({'phase': 'Simulator (outside phases)', 'calls': 1, 'total_secs': self.elapsed,
+                     'self_secs': self.elapsed - self.run_inner})
+        return rows
+
+    def format_summary(self):
+        lines = ["{:<30} {:>10} {:>11} {:>11} {:>10} {:>8}".format('Phase', 'Calls', 'Total (s)', 'Self (s)', 'us/call', '% self')]
+        for row in self.summary():
+            lines.append("{:<30} {:>10} {:>11.4f} {:>11.4f} {:>10.2f} {:>7.1f}%".format(
+                row['phase'], row['calls'], row['total_secs'], row['self_secs'], row['total_secs'] / row['calls'] * 1e6,
+                row['self_secs'] / self.elapsed * 100 if self.elapsed else 0.0))
+        return '\n'.join(lines)
+
+
+class SamplingProfiler(object):
+    """Samples the call stack every `interval` secs of CPU time (SIGPROF; main thread, Unix only).
+
+    save() writes the samples as folded stacks ('outer;...;inner count' per line), the input format of
+    flamegraph.pl, speedscope and other flame graph viewers.
+    """
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.previous_handler = None
+
+    def sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            if not (code.co_name == 'timed' and frame.f_globals is globals()):  # leave PhaseTimer's wrappers out
+                names.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler)
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            for stack, count in sorted(self.stacks.iteritems()):
+                f.write("{} {}\n".format(stack, count))
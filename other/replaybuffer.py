@@ -0,0 +1,54 @@
+import numpy as np
+
+from seeding import derive_seed
+
+
+class ReplayBuffer(object):
+    """Last `capacity` transitions (state, action code, reward, next state, done) of an agent, for experience replay.
+
+    Transitions live in preallocated arrays, used as a ring buffer: once full, each new transition replaces the
+    oldest one. sample() draws minibatches of them (uniformly, with replacement) as index-able arrays.
+    """
+
+    def __init__(self, capacity, seed=None):
+        if capacity <= 0:
+            raise ValueError("ReplayBuffer capacity must be positive, got {}".format(capacity))
+        self.states = np.zeros(capacity, dtype=np.intp)
+        self.actions = np.zeros(capacity, dtype=np.intp)
+        self.rewards = np.zeros(capacity, dtype=float)
+        self.next_states = np.zeros(capacity, dtype=np.intp)
+        self.dones = np.zeros(capacity, dtype=bool)  # transition ends the trial: next state is not learned from
+        self.count = 0  # no. of transitions added so far (only the last `capacity` are kept)
+        # Own RandomState (unseeded if seed is None), so the buffer pickles with a checkpoint
+        self.random = np.random.RandomState(derive_seed(seed, 'replay') % 2 ** 32 if seed is not None else None)
+
+    @property
+    def capacity(self):
+        return len(self.states)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def restore(self, buffer):
+        """Take over the transitions and random state of buffer (e.g. from a checkpoint), in place: agents sharing
+        this buffer keep sharing it."""
+        self.states, self.actions, self.rewards = buffer.states, buffer.actions, buffer.rewards
+        self.next_states, self.dones = buffer.next_states, buffer.dones
+        self.count = buffer.count
+        self.random = buffer.random
+
+    def add(self, state, action, reward, next_state, done):
+        i = self.count % self.capacity
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.count += 1
+
+    def sample(self, batch_size):
+        """(states, actions, rewards, next_states, dones) arrays of batch_size transitions drawn from the buffer."""
+        if self.count == 0:
+            raise ValueError("Cannot sample from an empty ReplayBuffer")
+        i = self.random.randint(0, len(self), batch_size)
+        return self.states[i], self.actions[i], self.rewards[i], self.next_states[i], self.dones[i]
@@ -0,0 +1,162 @@
+import numpy as np
+
+headings = [(1, 0), (0, -1), (-1, 0), (0, 1)]  # ENWS, same order as Environment.valid_headings
+actions = [None, 'forward', 'left', 'right']  # same order as Environment.valid_actions
+turns = [(1, 0), (2, 1), (3, 3)]  # (action index, heading index offset): in ENWS order, left is +1 and right is -1
+max_intersections = 8191  # 4 headings each: every route length fits the int16 distances
+
+
+class RoadGraph(object):
+    """Road network over arbitrary intersections, stored as a CSR-style adjacency.
+
+    Roads are two-way and each intersection has at most one outgoing road per heading,
+    taken from the road's direction on the map. Shortest routes for every
+    (location, heading, destination) are precomputed on first use and shared by every
+    agent (and environment) using the graph.
+    """
+
+    def __init__(self, roads):
+        self.roads = []
+        self.intersections = []
+        self.index = {}
+        seen = set()
+        for a, b in roads:
+            if (a, b) in seen or (b, a) in seen:
+                continue  # road listed twice
+            seen.add((a, b))
+            for intersection in (a, b):
+                if intersection not in self.index:
+                    self.index[intersection] = len(self.intersections)
+                    self.intersections.append(intersection)
+            self.roads.append((a, b))
+            self.roads.append((b, a))
+
+        # CSR adjacency: the roads leaving intersection i are targets[indptr[i]:indptr[i + 1]]
+        n = len(self.intersections)
+        links = sorted((self.index[a], self.index[b], road_heading(a, b)) for a, b in self.roads)
+        self.indptr = np.zeros(n + 1, dtype=np.int32)
+        self.targets = np.array([link[1] for link in links], dtype=np.int32)
+        self.target_headings = np.array([link[2] for link in links], dtype=np.int8)
+        np.add.at(self.indptr, np.array([link[0] for link in links], dtype=int) + 1, 1)
+        self.indptr = np.cumsum(self.indptr, dtype=np.int32)
+
+        # Same adjacency keyed by heading, for O(1) moves (-1: no road that way)
+        self.next_node = np.full((n, len(headings)), -1, dtype=np.int32)
+        for i in xrange(n):
+            for e in xrange(self.indptr[i], self.indptr[i + 1]):
+                if self.next_node[i, self.target_headings[e]] != -1:
+                    raise ValueError("Intersection {} has more than one road heading {}".format(
+                        self.intersections[i], headings[self.target_headings[e]]))
+                self.next_node[i, self.target_headings[e]] = self.targets[e]
+
+        self._route_table = None
+        self._distances = None
+
+    @classmethod
+    def load(cls, filename):
+        """Load roads from a text file with one 'x1 y1 x2 y2' line per two-way road ('#' starts a comment)."""
+        roads = []
+        with open(filename) as f:
+            for line in f:
+                fields = line.split('#', 1)[0].split()
+                if not fields:
+                    continue
+                x1, y1, x2, y2 = [int(field) for field in fields]
+                roads.append(((x1, y1), (x2, y2)))
+        return cls(roads)
+
+    @property
+    def bounds(self):
+        xs = [intersection[0] for intersection in self.intersections]
+        ys = [intersection[1] for intersection in self.intersections]
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def neighbour(self, location, heading):
+        """Intersection reached by driving one block from location along heading, or None if there is no road."""
+        j = self.next_node.item(self.index[location], headings.index(heading))
+        return self.intersections[j] if j >= 0 else None
+
+    def next_waypoint(self, location, heading, destination):
+        """First action of a shortest route to destination (None when already there)."""
+        return actions[self.route_table.item(self.index[location], headings.index(heading), self.index[destination])]
+
+    def distance(self, a, b):
+        """No. of moves on a shortest route from a to b, over all starting headings (-1 if unreachable)."""
+        if self._distances is None:
+            self.build_routes()
+        return self._distances.item(self.index[a], self.index[b])
+
+    @property
+    def distances(self):
+        """distance() for every pair of intersections, by [a, b] (in intersection order), as an int16 array."""
+        if self._distances is None:
+            self.build_routes()
+        return self._distances
+
+    @property
+    def route_table(self):
+        """Next waypoint (action index) by [location, heading, destination], as an int8 array."""
+        if self._route_table is None:
+            self.build_routes()
+        return self._route_table
+
+    def build_routes(self):
+        """Shortest routes to every destination, by one backward BFS over (intersection, heading) states each.
+
+        Working memory is O(no. of states); what is kept is the route table (4 * n * n bytes for n intersections)
+        and the distances (2 * n * n bytes), so graphs are limited to max_intersections intersections.
+        """
+        n = len(self.intersections)
+        if n > max_intersections:
+            raise ValueError("Routes are only precomputed for up to {} intersections, got {}".format(max_intersections, n))
+        n_states = n * len(headings)
+
+        # Successor state of every state for each action ((i, h) is state i * 4 + h; -1: no road)
+        successors = np.full((n_states, len(turns)), -1, dtype=np.int32)
+        for i in xrange(n):
+            for h in xrange(len(headings)):
+                for a, (_, offset) in enumerate(turns):
+                    new_heading = (h + offset) % len(headings)
+                    j = self.next_node[i, new_heading]
+                    if j >= 0:
+                        successors[i * len(headings) + h, a] = j * len(headings) + new_heading
+
+        # Predecessor of every state for each action (unique: roads are two-way, at most one per heading)
+        predecessors = np.full((n_states, len(turns)), -1, dtype=np.int32)
+        for a in xrange(len(turns)):
+            valid = np.flatnonzero(successors[:, a] >= 0)
+            predecessors[successors[valid, a], a] = valid
+
+        unreachable = np.iinfo(np.int16).max
+        action_indices = np.array([action_index for action_index, _ in turns], dtype=np.int8)
+        table = np.zeros((n_states, n), dtype=np.int8)
+        distances = np.full((n, n), -1, dtype=np.int16)
+        dist = np.empty(n_states + 1, dtype=np.int16)  # dist[-1] stays unreachable: it is where "no road" (-1) points
+        for d in xrange(n):
+            # dist[s]: no. of moves from state s to destination d, expanded backwards one level at a time
+            dist.fill(unreachable)
+            frontier = np.arange(d * len(headings), (d + 1) * len(headings))
+            level = 0
+            while len(frontier):
+                dist[frontier] = level
+                level += 1
+                frontier = np.unique(predecessors[frontier])
+                frontier = frontier[(frontier >= 0) & (dist[frontier] == unreachable)]
+
+            # Pick the action leading to the closest successor (forward, then left, then right on ties)
+            candidates = dist[successors]
+            column = np.where(candidates.min(axis=1) < unreachable, action_indices[candidates.argmin(axis=1)], 0)
+            column[dist[:-1] == 0] = 0  # already at destination
+            table[:, d] = column
+            closest = dist[:-1].reshape(n, len(headings)).min(axis=1)
+            distances[:, d] = np.where(closest == unreachable, -1, closest)
+
+        self._route_table = table.reshape(n, len(headings), n)
+        self._distances = distances
+
+def road_heading(a, b):
+    """Index of the heading of the road from a to b, along its dominant axis."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if abs(dx) >= abs(dy):
+        return headings.index((1 if dx > 0 else -1, 0))
+    return headings.index((0, 1 if dy > 0 else -1))
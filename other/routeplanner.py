@@ -1,7 +1,7 @@
 import random
 
 class RoutePlanner(object):
-    """Silly route planner that is meant for a perpendicular grid network."""
+    """Silly route planner that is meant for a perpendicular grid network (or uses the routes of a RoadGraph)."""
 
     def __init__(self, env, agent):
         self.env = env
@@ -9,12 +9,14 @@ class RoutePlanner(object):
         self.destination = None
 
     def route_to(self, destination=None):
-        self.destination = destination if destination is not None else random.choice(self.env.intersections.keys())
+        self.destination = destination if destination is not None else self.env.random.choice(self.env.intersection_list)
         # print "RoutePlanner.route_to(): destination = {}".format(destination)  # [debug]
 
     def next_waypoint(self):
         location = self.env.agent_states[self.agent]['location']
         heading = self.env.agent_states[self.agent]['heading']
+        if self.env.road_graph is not None:
+            return self.env.road_graph.next_waypoint(location, heading, self.destination)  # precomputed shortest routes
         delta = (self.destination[0] - location[0], self.destination[1] - location[1])
         if delta[0] == 0 and delta[1] == 0:
             return None
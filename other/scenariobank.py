@@ -0,0 +1,98 @@
+import os
+import numpy as np
+
+headings = [(1, 0), (0, -1), (-1, 0), (0, 1)]  # ENWS, same order as Environment.valid_headings
+columns = ['start', 'destination', 'heading', 'deadline', 'dummy_locations', 'dummy_headings', 'light_initial']
+min_distance = 4  # same as Environment.reset: start and destination are not too close
+chunk_size = 10000  # trials generated at a time
+
+
+class ScenarioBank(object):
+    """Pregenerated trial set-ups, read by Environment.reset instead of drawing them at random.
+
+    Each scenario holds the primary agent's start, destination, heading and deadline, every dummy's location and
+    heading, and the initial state of every traffic light; light periods are shared by all scenarios. Stored as a
+    directory of .npy files, one per column, which are memory-mapped: a bank can be much larger than memory, and
+    processes reading the same bank (e.g. the workers of a sweep) share its pages.
+    Locations are intersection indices, in Environment.intersections order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.intersections = np.load(os.path.join(path, 'intersections.npy'))
+        self.light_period = np.load(os.path.join(path, 'light_period.npy'))
+        self.columns = dict((name, np.asarray(np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))) for name in columns)
+
+    def __len__(self):
+        return len(self.columns['start'])
+
+    @property
+    def n_dummies(self):
+        return self.columns['dummy_locations'].shape[1]
+
+    def scenario(self, trial):
+        """Set-up of the given trial (banks are cycled through if there are more trials than scenarios)."""
+        i = trial % len(self)
+        return dict((name, column[i]) for name, column in self.columns.iteritems())
+
+    def check(self, env):
+        """Raise ValueError unless the bank was generated for env's map."""
+        if self.intersections.tolist() != [list(intersection) for intersection in env.intersection_list]:
+            raise ValueError("Scenario bank {} was generated for another map".format(self.path))
+
+    @classmethod
+    def generate(cls, path, env, n_trials, seed=None):
+        """Draw n_trials scenarios for env (its map and no. of dummies), write them to directory path and open it."""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        rng = np.random.RandomState(seed)
+        n_intersections = len(env.intersections)
+        n_dummies = env.num_dummies
+        location_type = np.int16 if n_intersections < 2 ** 15 else np.int32
+        if env.road_graph is not None:
+            distance = lambda a, b: env.road_graph.distances[a, b]
+            max_distance = env.road_graph.distances.max()
+        else:
+            coordinates = np.array(env.intersection_list)
+            distance = lambda a, b: np.abs(coordinates[a] - coordinates[b]).sum(axis=1)
+            max_distance = np.ptp(coordinates, axis=0).sum()
+        if max_distance < min_distance:
+            raise ValueError("No start and destination are {} moves apart on this map".format(min_distance))
+
+        np.save(os.path.join(path, 'intersections.npy'), np.array(env.intersection_list, dtype=np.int32))
+        np.save(os.path.join(path, 'light_period.npy'), rng.choice([3, 4, 5], size=n_intersections).astype(np.int8))
+        shapes = {
+            'start': ((n_trials,), location_type),
+            'destination': ((n_trials,), location_type),
+            'heading': ((n_trials,), np.int8),
+            'deadline': ((n_trials,), np.int16),
+            'dummy_locations': ((n_trials, n_dummies), location_type),
+            'dummy_headings': ((n_trials, n_dummies), np.int8),
+            'light_initial': ((n_trials, n_intersections), bool),
+        }
+        files = dict((name, np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+', dtype=dtype, shape=shape))
+                     for name, (shape, dtype) in shapes.iteritems())
+
+        for begin in xrange(0, n_trials, chunk_size):
+            n = min(chunk_size, n_trials - begin)
+            start = rng.randint(n_intersections, size=n)
+            destination = rng.randint(n_intersections, size=n)
+            too_close = distance(start, destination) < min_distance
+            while too_close.any():  # redraw both, as Environment.reset does
+                start[too_close] = rng.randint(n_intersections, size=too_close.sum())
+                destination[too_close] = rng.randint(n_intersections, size=too_close.sum())
+                too_close = distance(start, destination) < min_distance
+
+            chunk = slice(begin, begin + n)
+            files['start'][chunk] = start
+            files['destination'][chunk] = destination
+            files['heading'][chunk] = rng.randint(len(headings), size=n)
+            files['deadline'][chunk] = distance(start, destination) * 5
+            files['dummy_locations'][chunk] = rng.randint(n_intersections, size=(n, n_dummies))
+            files['dummy_headings'][chunk] = rng.randint(len(headings), size=(n, n_dummies))
+            files['light_initial'][chunk] = rng.randint(2, size=(n, n_intersections))
+
+        for f in files.itervalues():
+            f.flush()
+        del files
+        return cls(path)
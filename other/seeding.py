@@ -0,0 +1,15 @@
+import hashlib
+import random
+
+
+def derive_seed(seed, *keys):
+    """Seed of an independent random stream for (seed, *keys), e.g. (run seed, grid point) or (env seed, trial).
+
+    Hash-based, so the result only depends on its arguments: not on the process, the worker or the order of calls.
+    """
+    return int(hashlib.md5(repr((seed,) + keys)).hexdigest()[:16], 16)
+
+
+def make_random(seed):
+    """A random.Random seeded with seed, or the global random module if seed is None (the old behaviour)."""
+    return random.Random(seed) if seed is not None else random
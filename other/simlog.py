@@ -0,0 +1,85 @@
+import logging
+import sys
+from collections import deque
+
+# Levels: INFO for per-trial messages, DEBUG for extra set-up details, TRACE for per-step messages
+TRACE = 5
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+logging.addLevelName(TRACE, 'TRACE')
+
+logger = logging.getLogger('smartcab')
+logger.propagate = False
+logger.setLevel(WARNING)
+
+console = logging.StreamHandler(sys.stdout)
+console.setFormatter(logging.Formatter('%(message)s'))
+logger.addHandler(console)
+
+recorder = None  # FlightRecorder, when enabled by configure()
+trace_enabled = False  # cached, so per-step trace() calls cost a single check when disabled
+
+
+class FlightRecorder(logging.Handler):
+    """Keeps the last `capacity` log records (of any level) in memory and writes them out only on dump().
+
+    Records are stored unformatted, so nothing is formatted unless a dump happens.
+    """
+
+    def __init__(self, capacity, target):
+        logging.Handler.__init__(self, TRACE)
+        self.records = deque(maxlen=capacity)
+        self.target = target
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        self.records.clear()
+
+    def dump(self):
+        for record in self.records:
+            self.target.handle(record)
+        self.records.clear()
+
+
+def configure(level=WARNING, flight_recorder=0):
+    """Print messages at `level` and above.
+
+    With flight_recorder=N, the last N messages of any level are also kept in memory and
+    printed when a trial fails (see trial_failed).
+    """
+    global recorder, trace_enabled
+    if recorder is not None:
+        logger.removeHandler(recorder)
+        recorder = None
+
+    console.setLevel(level)
+    if flight_recorder:
+        target = logging.StreamHandler(sys.stdout)
+        target.setFormatter(logging.Formatter('    [recorded] %(levelname)s %(message)s'))
+        recorder = FlightRecorder(flight_recorder, target)
+        logger.addHandler(recorder)
+        logger.setLevel(TRACE)
+    else:
+        logger.setLevel(level)
+
+    trace_enabled = logger.isEnabledFor(TRACE)
+
+
+def trace(msg, *args):
+    """Log a per-step message; args are only formatted if it is printed or dumped."""
+    if trace_enabled:
+        logger.log(TRACE, msg, *args)
+
+
+def trial_started():
+    if recorder is not None:
+        recorder.clear()
+
+
+def trial_failed():
+    if recorder is not None:
+        recorder.target.stream.write("Trial failed; last {} recorded messages:\n".format(len(recorder.records)))
+        recorder.dump()
@@ -0,0 +1,151 @@
+import itertools
+import os
+import multiprocessing
+import random
+import shutil
+import tempfile
+import pandas as pd
+
+from environment import Environment
+from agents import QLearningAgent
+from simulator import Simulator
+from seeding import derive_seed
+
+# Swept QLearningAgent parameters, in nesting order (the last one varies fastest)
+sweep_params = ['q_init_value', 'alpha_rate', 'epsilon_rate', 'gamma_rate']
+
+stats_columns = sweep_params + ['success_perc', 'traffic_violations_avg', 'explored_states_avg', 'reward_cum_avg', 'actions_avg']
+
+
+def simulate_point(point):
+    """Train a QLearningAgent for one grid point and aggregate its last `threshold` rounds (runs in a worker)."""
+    q_init_value, alpha_rate, epsilon_rate, gamma_rate, n_trials, threshold, seed, checkpoint, scenarios, env_seed = point
+
+    # With a run seed, each point gets its own streams, derived from its parameters only; with an env_seed, the
+    # environment's streams are that seed's instead, the same for every point (common random numbers)
+    params = (q_init_value, alpha_rate, epsilon_rate, gamma_rate)
+    if env_seed is None and seed is not None:
+        env_seed = derive_seed(seed, 'environment', *params)
+    e = Environment(seed=env_seed, scenarios=scenarios)
+    a = QLearningAgent(
+        e,
+        alpha_rate=alpha_rate, epsilon_rate=epsilon_rate, gamma_rate=gamma_rate, q_init_value=q_init_value,
+        seed=derive_seed(seed, 'agent', *params) if seed is not None else None,
+        stats_window=threshold, stats_capacity=0
+    )
+    e.set_primary_agent(a, enforce_deadline=True)
+    s = Simulator(e, display=False)
+    s.run(n_trials=n_trials, checkpoint=checkpoint)
+
+    row = a.trial_stats.window_summary()
+    row.update(zip(sweep_params, params))
+    return row
+
+
+def grid_points(param_grid, checkpoint_dir):
+    """Combinations of param_grid in nested-loop order, each with its checkpoint directory (or None)."""
+    points = list(itertools.product(*[param_grid[p] for p in sweep_params]))
+    return [(point, os.path.join(checkpoint_dir, 'point-{}'.format(i)) if checkpoint_dir is not None else None)
+            for i, point in enumerate(points)]
+
+
+def simulate_points(pool, points, n_trials, threshold, seed, scenarios, env_seed=None):
+    """Rows of simulate_point for (params, checkpoint) points, run across pool, in the order of points."""
+    stats = []
+    for row in pool.imap(simulate_point, [params + (n_trials, threshold, seed, checkpoint, scenarios, env_seed)
+                                          for params, checkpoint in points]):
+        stats.append(row)
+        print "Simulated {}/{} ({} trials): q_init_value: {}, alpha_rate: {}, epsilon_rate: {}, gamma_rate: {}". \
+            format(len(stats), len(points), n_trials, row['q_init_value'], row['alpha_rate'], row['epsilon_rate'], row['gamma_rate'])
+    return stats
+
+
+def make_pool(processes):
+    # Reseed each worker, otherwise forked workers would all replay the parent's random sequence
+    return multiprocessing.Pool(processes, initializer=random.seed)
+
+
+def run_sweep(param_grid, n_trials=100, threshold=10, processes=None, csv_path=None, seed=None, checkpoint_dir=None,
+              scenarios=None):
+    """Simulate every combination of param_grid (a dict of sweep_params -> values) across a process pool.
+
+    Grid points are independent, so they are spread over `processes` workers (default: all cores).
+    Returns one row per point, in nested-loop order, as a DataFrame; also written to csv_path if given.
+    With a seed, results are reproducible and identical for any number of processes (including a serial run).
+    With a checkpoint_dir, each point checkpoints its training there, so an interrupted sweep picks up where it
+    stopped when run again (finished points are just reloaded).
+    With scenarios (the directory of a ScenarioBank), every point is trained on the same trials, read from the bank.
+    """
+    pool = make_pool(processes)
+    try:
+        stats = simulate_points(pool, grid_points(param_grid, checkpoint_dir), n_trials, threshold, seed, scenarios)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    df = pd.DataFrame(data=stats, columns=stats_columns)
+    if csv_path is not None:
+        df.to_csv(csv_path)
+
+    return df
+
+
+def run_successive_halving(param_grid, n_trials=100, min_trials=10, eta=2, metric='success_perc', minimize=False,
+                           threshold=10, processes=None, csv_path=None, seed=None, checkpoint_dir=None, scenarios=None):
+    """Sweep param_grid as run_sweep does, but only give the full n_trials to the most promising points.
+
+    Every point is first trained for min_trials; then, rung after rung, only the best 1/eta of the points (by
+    `metric` over their last `threshold` trials, ties broken by reward) are kept and trained on, for eta times as
+    many trials, up to n_trials. Survivors resume from their checkpoints, so the whole grid costs a fraction of a
+    full sweep.
+    With a seed, every point of a rung runs in the same environment streams, from a seed derived for the rung
+    (common random numbers), so points are compared on the same trials, traffic and lights.
+    Returns one row per point, with the no. of trials it got (its last rung), in nested-loop order; also written
+    to csv_path if given. Checkpoints go to checkpoint_dir if given (the sweep then resumes as run_sweep does),
+    otherwise to a temporary directory. With scenarios, as in run_sweep, all points are ranked on the same trials.
+    """
+    if metric not in stats_columns[len(sweep_params):]:
+        raise ValueError("Unknown metric: {} (one of {})".format(metric, ', '.join(stats_columns[len(sweep_params):])))
+    if eta < 2:
+        raise ValueError("eta must be at least 2, got {}".format(eta))
+    temporary_dir = tempfile.mkdtemp(prefix='sweep-') if checkpoint_dir is None else None
+    points = grid_points(param_grid, checkpoint_dir if checkpoint_dir is not None else temporary_dir)
+    stats = [None] * len(points)
+    survivors = range(len(points))
+    budget = min(min_trials, n_trials)
+    rung = 0
+
+    pool = make_pool(processes)
+    try:
+        while True:
+            print "Rung: {} point(s), {} trials".format(len(survivors), budget)
+            rung_seed = derive_seed(seed, 'rung', rung) if seed is not None else None
+            rows = simulate_points(pool, [points[i] for i in survivors], budget, threshold, seed, scenarios, rung_seed)
+            for i, row in zip(survivors, rows):
+                row['n_trials'] = budget
+                stats[i] = row
+            if budget >= n_trials:
+                break
+
+            sign = 1 if minimize else -1
+            ranked = sorted(survivors, key=lambda i: (sign * stats[i][metric], -stats[i]['reward_cum_avg']))
+            survivors = sorted(ranked[:max(1, -(-len(survivors) // eta))])  # ceil(len / eta), back in grid order
+            budget = min(budget * eta, n_trials)
+            rung += 1
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir)
+
+    df = pd.DataFrame(data=stats, columns=stats_columns + ['n_trials'])
+    if csv_path is not None:
+        df.to_csv(csv_path)
+
+    return df
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+
+from batchenv import BatchEnvironment, action_codes, observation_fields
+
+
+class BatchEnvironmentTest(unittest.TestCase):
+    """Observations are what the agents sense when they act on them."""
+
+    def check_observations(self, **env_kwargs):
+        batch = BatchEnvironment(4, seed=0, **env_kwargs)
+        acted_on = []  # what each agent sensed when it acted, in step order
+
+        def recording_act(env, act):
+            def record(agent, action):
+                if agent is not env.primary_agent:
+                    return act(agent, action)
+                inputs = env.sense(agent)
+                acted_on.append((int(inputs['light'] == 'green'), action_codes[inputs['oncoming']], action_codes[inputs['left']],
+                                 action_codes[inputs['right']], action_codes[agent.next_waypoint], env.get_deadline(agent)))
+                return act(agent, action)
+            return record
+
+        for env in batch.envs:
+            env.act = recording_act(env, env.act)
+        rng = np.random.RandomState(0)
+        observations = batch.reset()
+        for _ in xrange(300):
+            del acted_on[:]
+            next_observations, _, _, _ = batch.step(rng.randint(4, size=batch.n_envs))
+            self.assertEqual(acted_on, [tuple(row) for row in observations.tolist()])
+            observations = next_observations
+        self.assertEqual(observations.shape, (batch.n_envs, len(observation_fields)))
+
+    def test_observations_are_act_time_inputs(self):
+        self.check_observations(num_dummies=20)
+
+    def test_observations_are_act_time_inputs_with_fleet(self):
+        self.check_observations(num_dummies=20, dummy_fleet=True)
+
+    def test_info_flags(self):
+        batch = BatchEnvironment(8, seed=1)
+        batch.reset()
+        rng = np.random.RandomState(1)
+        for _ in xrange(300):
+            _, _, done, info = batch.step(rng.randint(4, size=batch.n_envs))
+            self.assertEqual(sorted(info), ['success', 'timeout'])
+            self.assertTrue(((info['success'] | info['timeout']) == done).all())
+            self.assertFalse((info['success'] & info['timeout']).any())
+
+
+if __name__ == '__main__':
+    unittest.main()
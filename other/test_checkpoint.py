@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import unittest
+
+from agents import QLearningAgent
+from environment import Environment
+from simulator import Simulator
+
+
+def run(n_trials, checkpoint=None):
+    """Primary agent and two learners sharing its Q-table and replay buffer, trained for n_trials."""
+    params = dict(alpha_rate=0.5, epsilon_rate=0.1, gamma_rate=0.5, q_init_value=0.0, replay_capacity=200)
+    env = Environment(seed=1)
+    primary = env.create_agent(QLearningAgent, seed=2, **params)
+    env.set_primary_agent(primary, enforce_deadline=True)
+    for i in xrange(2):
+        learner = env.create_agent(QLearningAgent, seed=10 + i, **params)
+        learner.share_q_table(primary)
+        env.add_learner(learner)
+    results = Simulator(env, display=False).run(n_trials=n_trials, checkpoint=checkpoint, checkpoint_every=4)
+    return results, env
+
+
+class CheckpointLearnersTest(unittest.TestCase):
+    """A resumed run with learners goes on as if it had never stopped."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_resume_with_learners(self):
+        results, env = run(12)
+        run(10, self.path)
+        resumed_results, resumed_env = run(12, self.path)
+
+        self.assertEqual(resumed_results.tolist(), results.tolist())
+        primary = resumed_env.primary_agent
+        self.assertEqual(primary.q_matrix.tolist(), env.primary_agent.q_matrix.tolist())
+        for learner, resumed_learner in zip(env.learners, resumed_env.learners):
+            self.assertIs(resumed_learner.q_matrix, primary.q_matrix)
+            self.assertIs(resumed_learner.replay_buffer, primary.replay_buffer)
+            self.assertEqual(resumed_learner.trial_stats.count, 12)
+            self.assertEqual(resumed_learner.trial_stats.rows.tolist(), learner.trial_stats.rows.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
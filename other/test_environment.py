@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+import unittest
+
+from agents import QLearningAgent
+from environment import Environment
+from scenariobank import ScenarioBank
+
+
+class ScenarioBankLearnerTest(unittest.TestCase):
+    """Learners are not dummies: a scenario bank still fits an environment with learners."""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_reset_with_learner(self):
+        bank = ScenarioBank.generate(self.path, Environment(num_dummies=3), 5, seed=0)
+        env = Environment(num_dummies=3, seed=0, scenarios=bank)
+        primary = env.create_agent(QLearningAgent, seed=0)
+        env.set_primary_agent(primary, enforce_deadline=True)
+        learner = env.create_agent(QLearningAgent, seed=1)
+        learner.share_q_table(primary)
+        env.add_learner(learner)
+
+        for trial in xrange(3):
+            env.reset()
+            scenario = bank.scenario(trial)
+            self.assertEqual(env.agent_states[primary]['destination'], env.intersection_list[scenario['destination']])
+            self.assertIsNotNone(env.agent_states[learner]['destination'])
+            while not env.done:
+                env.step()
+        self.assertEqual(primary.trial_stats.count, 3)
+        self.assertEqual(learner.trial_stats.count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
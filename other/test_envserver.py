@@ -0,0 +1,90 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+import envprotocol
+from agents import ExternalAgent
+from batchenv import observation
+from envclient import EnvironmentClient
+from environment import Environment
+
+
+class EnvironmentServerTest(unittest.TestCase):
+    """Replies of a server in another process match the same commands run in-process."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        address = os.path.join(self.directory, 'envserver.sock')
+        self.server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'envserver.py'),
+                                        '--unix', address], stdout=open(os.devnull, 'w'))
+        for _ in xrange(100):
+            if os.path.exists(address):
+                break
+            time.sleep(0.05)
+        self.client = EnvironmentClient(address)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.kill()
+        self.server.wait()
+        shutil.rmtree(self.directory)
+
+    def test_step_replies_match_in_process(self):
+        seeds = [3, 4]
+        env_ids = self.client.create(len(seeds), num_dummies=3, seed=seeds[0])
+        envs = []
+        for seed in seeds:
+            env = Environment(num_dummies=3, seed=seed)
+            agent = env.create_agent(ExternalAgent)
+            env.set_primary_agent(agent, enforce_deadline=True)
+            envs.append((env, agent))
+
+        def check(replies, rewards):
+            for reply, (env, agent), reward in zip(replies, envs, rewards):
+                light, oncoming, left, right, next_waypoint, deadline = observation(env, agent)
+                self.assertTrue(reply.ok)
+                self.assertEqual(reply.done, env.done)
+                self.assertAlmostEqual(reply.reward, reward, places=5)
+                self.assertEqual(reply.deadline, deadline)
+                self.assertEqual(reply.inputs, {'light': envprotocol.lights[light], 'oncoming': envprotocol.actions[oncoming],
+                                                'left': envprotocol.actions[left], 'right': envprotocol.actions[right]})
+                self.assertEqual(reply.next_waypoint, envprotocol.actions[next_waypoint])
+
+        for env, _ in envs:
+            env.reset()
+            env.advance()
+        check(self.client.reset(env_ids), [0.0] * len(envs))
+        rng = np.random.RandomState(0)
+        for _ in xrange(200):
+            actions = [envprotocol.actions[a] for a in rng.randint(4, size=len(envs))]
+            rewards = []
+            for (env, agent), action in zip(envs, actions):
+                agent.action = action
+                env.step()
+                rewards.append(agent.reward)
+                if not env.done:
+                    env.advance()
+            check(self.client.step(env_ids, actions), rewards)
+            done = [env_id for env_id, (env, _) in zip(env_ids, envs) if env.done]
+            if done:
+                self.client.reset(done)
+                for env, _ in envs:
+                    if env.done:
+                        env.reset()
+                        env.advance()
+
+    def test_create_limits(self):
+        replies = self.client.call([(envprotocol.CREATE, envprotocol.no_seed, -1),
+                                    (envprotocol.CREATE, envprotocol.no_seed, 10 ** 6),
+                                    (envprotocol.CREATE, envprotocol.no_seed, 3)])
+        self.assertEqual([reply.ok for reply in replies], [False, False, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import random
+import unittest
+
+from roadgraph import RoadGraph, actions, headings, turns
+
+
+def drive(graph, location, heading, destination):
+    """No. of moves following next_waypoint() from (location, heading) to destination (None if it never gets there)."""
+    for moves in xrange(4 * len(graph.intersections)):
+        if location == destination:
+            return moves
+        action = graph.next_waypoint(location, heading, destination)
+        if action is None:
+            return None
+        offset = dict((actions[action_index], offset) for action_index, offset in turns)[action]
+        heading = headings[(headings.index(heading) + offset) % len(headings)]
+        location = graph.neighbour(location, heading)
+    return None
+
+
+class RoadGraphRoutesTest(unittest.TestCase):
+    """Precomputed routes are shortest routes, on a grid with missing roads (some parts cut off)."""
+
+    def setUp(self):
+        rng = random.Random(0)
+        roads = [((x, y), (x + 1, y)) for x in xrange(5) for y in xrange(5)]
+        roads += [((x, y), (x, y + 1)) for x in xrange(6) for y in xrange(4)]
+        self.graph = RoadGraph([road for road in roads if rng.random() < 0.7])
+
+    def test_routes(self):
+        graph = self.graph
+        for a in graph.intersections:
+            for b in graph.intersections:
+                # Without U-turns a car may be stuck in a dead end, but the best heading gets there in distance() moves
+                moves = [m for m in (drive(graph, a, heading, b) for heading in headings) if m is not None]
+                self.assertEqual(min(moves) if moves else -1, graph.distance(a, b))
+        self.assertEqual(graph.distances.dtype.itemsize, 2)
+        self.assertEqual(graph.route_table.dtype.itemsize, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# One row per trial, as in QLearningAgent.stats_by_simulation_add_row
+row_dtype = [
+    ('success', bool),
+    ('cum_reward', float),
+    ('explored_states_cum', int),
+    ('traffic_violations_count', int),
+    ('actions_count', int),
+]
+fields = [name for name, _ in row_dtype]
+
+
+class TrialStats(object):
+    """Per-trial stats of an agent, aggregated as they come: over all trials and over the last `window` trials.
+
+    Memory does not grow with the no. of trials, unless rows are kept: capacity > 0 preallocates that many rows
+    (doubled whenever it runs out), so stats can still be inspected trial by trial.
+    """
+
+    def __init__(self, window=10, capacity=0):
+        self.count = 0
+        self.totals = np.zeros(len(fields))  # running sums of every field
+        self.recent = np.zeros(window, dtype=row_dtype)  # ring buffer of the last `window` rows
+        self._rows = np.zeros(capacity, dtype=row_dtype) if capacity > 0 else None
+
+    @property
+    def window(self):
+        return len(self.recent)
+
+    def add(self, success, cum_reward, explored_states_cum, traffic_violations_count, actions_count):
+        row = (success, cum_reward, explored_states_cum, traffic_violations_count, actions_count)
+        self.totals += row
+        if self.window > 0:
+            self.recent[self.count % self.window] = row
+        if self._rows is not None:
+            if self.count == len(self._rows):
+                self._rows = np.resize(self._rows, max(1, 2 * len(self._rows)))
+            self._rows[self.count] = row
+        self.count += 1
+
+    def summary(self):
+        """Means over all trials, keyed like the rows of a sweep."""
+        return self._summary(self.totals, self.count)
+
+    def window_summary(self):
+        """Means over the last `window` trials (or fewer, if not that many have run)."""
+        recent = self.recent[:min(self.count, self.window)]
+        return self._summary([recent[name].sum() for name in fields], len(recent))
+
+    @staticmethod
+    def _summary(sums, n):
+        n = float(max(n, 1))
+        success, cum_reward, explored_states, traffic_violations, actions = sums
+        return {
+            'success_perc': success / n * 100,
+            'traffic_violations_avg': traffic_violations / n,
+            'explored_states_avg': explored_states / n,
+            'reward_cum_avg': cum_reward / n,
+            'actions_avg': actions / n,
+        }
+
+    @property
+    def rows(self):
+        """Every row so far, as a record array (None unless created with capacity > 0)."""
+        return self._rows[:self.count] if self._rows is not None else None
+
+    def as_df(self):
+        """Rows as a DataFrame, numbered by simulation_round (empty if rows are not kept: see summary() instead)."""
+        rows = self.rows if self._rows is not None else np.zeros(0, dtype=row_dtype)
+        df = pd.DataFrame(rows, columns=fields)
+        df.insert(0, 'simulation_round', np.arange(1, len(rows) + 1))
+        return df
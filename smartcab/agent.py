@@ -1,4 +1,5 @@
 import random
+import simlog
 from environment import Agent, Environment
 from planner import RoutePlanner
 from simulator import Simulator
@@ -6,7 +7,7 @@ from simulator import Simulator
 class LearningAgent(Agent):
     """An agent that learns to drive in the smartcab world."""
 
-    def __init__(self, env, alpha_rate=0.7, epsilon_rate=0.9, gamma_rate=0.5, q_init_value=10.0, debug_traces=False):
+    def __init__(self, env, alpha_rate=0.7, epsilon_rate=0.9, gamma_rate=0.5, q_init_value=10.0):
         super(LearningAgent, self).__init__(env)  # sets self.env = env, state = None, next_waypoint = None, and a default color
         self.color = 'red'  # override color
         self.planner = RoutePlanner(self.env, self)  # simple route planner to get next_waypoint
@@ -17,7 +18,6 @@ class LearningAgent(Agent):
         self.epsilon = epsilon_rate  # Exploration rate
         self.gamma = gamma_rate  # Discount factor rate
         self.q_init_value = q_init_value  # Initial value for the q matrix
-        self.debug_traces = debug_traces
 
         self.q_matrix = {}
 
@@ -138,8 +138,8 @@ class LearningAgent(Agent):
         self.previous_state = self.state
         self.previous_action = action
 
-        print "LearningAgent.update(): deadline = {}, inputs = {}, action = {}, reward = {}" . \
-            format(deadline, inputs, action, reward)  # [debug]
+        simlog.trace("LearningAgent.update(): deadline = %s, inputs = %s, action = %s, reward = %s",
+                     deadline, inputs, action, reward)  # [debug]
 
         # # Code for stats purpose - BEGIN
         # self.actions_count += 1
@@ -151,6 +151,9 @@ class LearningAgent(Agent):
 def run():
     """Run the agent for a finite number of trials."""
 
+    simlog.configure(simlog.INFO)  # print per-trial messages
+    # NOTE: Use simlog.TRACE to print every step, or flight_recorder=N to print the last N messages of failed trials only
+
     # Set up environment and agent
     e = Environment()  # create environment (also adds some dummy traffic)
     a = e.create_agent(LearningAgent)  # create agent
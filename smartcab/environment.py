@@ -1,26 +1,21 @@
 import time
 import random
+import numpy as np
 from collections import OrderedDict
 
+import simlog
+from roadgraph import RoadGraph
 from simulator import Simulator
 
 class TrafficLight(object):
-    """A traffic light that switches periodically."""
+    """A traffic light that switches periodically: its initial state and period (Environment keeps the lights as
+    arrays, see Environment.light_states)."""
 
     valid_states = [True, False]  # True = NS open, False = EW open
 
     def __init__(self, state=None, period=None):
         self.state = state if state is not None else random.choice(self.valid_states)
         self.period = period if period is not None else random.choice([3, 4, 5])
-        self.last_updated = 0
-
-    def reset(self):
-        self.last_updated = 0
-
-    def update(self, t):
-        if t - self.last_updated >= self.period:
-            self.state = not self.state  # assuming state is boolean
-            self.last_updated = t
 
 
 class Environment(object):
@@ -30,32 +25,57 @@ class Environment(object):
     valid_inputs = {'light': TrafficLight.valid_states, 'oncoming': valid_actions, 'left': valid_actions, 'right': valid_actions}
     valid_headings = [(1, 0), (0, -1), (-1, 0), (0, 1)]  # ENWS
     hard_time_limit = -100  # even if enforce_deadline is False, end trial when deadline reaches this value (to avoid deadlocks)
+    min_route_distance = 4  # a trial's start and destination are at least this many moves apart
 
-    def __init__(self, num_dummies=3):
+    def __init__(self, num_dummies=3, road_graph=None, grid_size=(8, 6)):
         self.num_dummies = num_dummies  # no. of dummy agents
         
         # Initialize simulation variables
         self.done = False
         self.t = 0
         self.agent_states = OrderedDict()
-        self.status_text = ""
+        self.agent_order = {}  # agent -> creation index, used to keep per-intersection lists in agent order
+        self.status = None  # (state, action, reward) of the primary agent's last move, formatted on demand
+        self.reset_trial_stats()
 
-        # Road network
-        self.grid_size = (8, 6)  # (cols, rows)
-        self.bounds = (1, 1, self.grid_size[0], self.grid_size[1])
+        # Road network: a wrap-around grid by default, or a RoadGraph (or road file to load one from)
         self.block_size = 100
         self.intersections = OrderedDict()
         self.roads = []
-        for x in xrange(self.bounds[0], self.bounds[2] + 1):
-            for y in xrange(self.bounds[1], self.bounds[3] + 1):
-                self.intersections[(x, y)] = TrafficLight()  # a traffic light at each intersection
-
-        for a in self.intersections:
-            for b in self.intersections:
-                if a == b:
-                    continue
-                if (abs(a[0] - b[0]) + abs(a[1] - b[1])) == 1:  # L1 distance = 1
-                    self.roads.append((a, b))
+        self.road_graph = RoadGraph.load(road_graph) if isinstance(road_graph, basestring) else road_graph
+        if self.road_graph is None:
+            self.grid_size = tuple(grid_size)  # (cols, rows)
+            self.bounds = (1, 1, self.grid_size[0], self.grid_size[1])
+            for x in xrange(self.bounds[0], self.bounds[2] + 1):
+                for y in xrange(self.bounds[1], self.bounds[3] + 1):
+                    self.intersections[(x, y)] = len(self.intersections)  # a traffic light at each intersection (its index)
+
+            # Roads join neighbouring intersections (L1 distance = 1), in both directions
+            neighbour_offsets = [(-1, 0), (0, -1), (0, 1), (1, 0)]  # in intersection order
+            for a in self.intersections:
+                for dx, dy in neighbour_offsets:
+                    b = (a[0] + dx, a[1] + dy)
+                    if self.bounds[0] <= b[0] <= self.bounds[2] and self.bounds[1] <= b[1] <= self.bounds[3]:
+                        self.roads.append((a, b))
+        else:
+            self.bounds = self.road_graph.bounds
+            self.grid_size = (self.bounds[2], self.bounds[3])  # used to size the GUI window
+            for intersection in self.road_graph.intersections:
+                self.intersections[intersection] = len(self.intersections)
+            self.roads = self.road_graph.roads
+        self.intersection_list = self.intersections.keys()  # for picking random locations
+        if self.max_route_distance() < self.min_route_distance:
+            raise ValueError("No start and destination are {} moves apart on this map".format(self.min_route_distance))
+
+        # Traffic lights, as arrays: each light only depends on its initial state, its period and the time (see light_states)
+        self.light_initial = np.zeros(len(self.intersections), dtype=bool)
+        self.light_period = np.zeros(len(self.intersections), dtype=int)
+        for i in xrange(len(self.intersections)):
+            traffic_light = TrafficLight()
+            self.light_initial[i] = traffic_light.state
+            self.light_period[i] = traffic_light.period
+        self.light_t = 0  # time of the lights' last update
+        self.intersection_agents = dict((intersection, []) for intersection in self.intersections)  # agents at each intersection
 
         # Dummy agents
         for i in xrange(self.num_dummies):
@@ -67,49 +87,73 @@ class Environment(object):
 
     def create_agent(self, agent_class, *args, **kwargs):
         agent = agent_class(self, *args, **kwargs)
-        self.agent_states[agent] = {'location': random.choice(self.intersections.keys()), 'heading': (0, 1)}
+        self.agent_states[agent] = {'location': random.choice(self.intersection_list), 'heading': (0, 1)}
+        self.place_agent(agent, self.agent_states[agent]['location'])
         return agent
 
     def set_primary_agent(self, agent, enforce_deadline=False):
         self.primary_agent = agent
         self.enforce_deadline = enforce_deadline
 
+    def place_agent(self, agent, location):
+        """Add agent to the index of agents at location, keeping it in agent creation order."""
+        order = self.agent_order.setdefault(agent, len(self.agent_order))
+        agents = self.intersection_agents[location]
+        agents.append(agent)
+        if len(agents) > 1 and self.agent_order[agents[-2]] > order:
+            agents.sort(key=self.agent_order.get)
+
+    def remove_agent(self, agent, location):
+        """Remove agent from the index of agents at location."""
+        self.intersection_agents[location].remove(agent)
+
+    def reset_trial_stats(self):
+        """Clear the per-trial outcome of the primary agent (read by Simulator after each trial)."""
+        self.trial_success = False
+        self.trial_steps = 0
+        self.trial_reward = 0.0
+        self.trial_violations = 0
+
     def reset(self):
         self.done = False
         self.t = 0
+        self.reset_trial_stats()
 
         # Reset traffic lights
-        for traffic_light in self.intersections.itervalues():
-            traffic_light.reset()
+        self.light_initial = self.light_states()  # lights carry on from the last trial
+        self.light_t = 0
 
         # Pick a start and a destination
-        start = random.choice(self.intersections.keys())
-        destination = random.choice(self.intersections.keys())
+        start = random.choice(self.intersection_list)
+        destination = random.choice(self.intersection_list)
 
         # Ensure starting location and destination are not too close
-        while self.compute_dist(start, destination) < 4:
-            start = random.choice(self.intersections.keys())
-            destination = random.choice(self.intersections.keys())
+        while self.compute_dist(start, destination) < self.min_route_distance:
+            start = random.choice(self.intersection_list)
+            destination = random.choice(self.intersection_list)
 
         start_heading = random.choice(self.valid_headings)
         deadline = self.compute_dist(start, destination) * 5
-        print "Environment.reset(): Trial set up with start = {}, destination = {}, deadline = {}".format(start, destination, deadline)
+        simlog.logger.info("Environment.reset(): Trial set up with start = %s, destination = %s, deadline = %s", start, destination, deadline)
+        simlog.trial_started()
 
         # Initialize agent(s)
+        for state in self.agent_states.itervalues():
+            del self.intersection_agents[state['location']][:]
         for agent in self.agent_states.iterkeys():
             self.agent_states[agent] = {
-                'location': start if agent is self.primary_agent else random.choice(self.intersections.keys()),
+                'location': start if agent is self.primary_agent else random.choice(self.intersection_list),
                 'heading': start_heading if agent is self.primary_agent else random.choice(self.valid_headings),
                 'destination': destination if agent is self.primary_agent else None,
                 'deadline': deadline if agent is self.primary_agent else None}
+            self.place_agent(agent, self.agent_states[agent]['location'])
             agent.reset(destination=(destination if agent is self.primary_agent else None))
 
     def step(self):
         #print "Environment.step(): t = {}".format(self.t)  # [debug]
 
-        # Update traffic lights
-        for intersection, traffic_light in self.intersections.iteritems():
-            traffic_light.update(self.t)
+        # Update traffic lights (computed on demand from light_t)
+        self.light_t = self.t
 
         # Update agents
         for agent in self.agent_states.iterkeys():
@@ -122,10 +166,12 @@ class Environment(object):
             agent_deadline = self.agent_states[self.primary_agent]['deadline']
             if agent_deadline <= self.hard_time_limit:
                 self.done = True
-                print "Environment.step(): Primary agent hit hard time limit ({})! Trial aborted.".format(self.hard_time_limit)
+                simlog.logger.info("Environment.step(): Primary agent hit hard time limit (%s)! Trial aborted.", self.hard_time_limit)
+                simlog.trial_failed()
             elif self.enforce_deadline and agent_deadline <= 0:
                 self.done = True
-                print "Environment.step(): Primary agent ran out of time! Trial aborted."
+                simlog.logger.info("Environment.step(): Primary agent ran out of time! Trial aborted.")
+                simlog.trial_failed()
             self.agent_states[self.primary_agent]['deadline'] = agent_deadline - 1
 
         self.t += 1
@@ -136,14 +182,16 @@ class Environment(object):
         state = self.agent_states[agent]
         location = state['location']
         heading = state['heading']
-        light = 'green' if (self.intersections[location].state and heading[1] != 0) or ((not self.intersections[location].state) and heading[0] != 0) else 'red'
+        light_state = self.light_state(location)
+        light = 'green' if (light_state and heading[1] != 0) or ((not light_state) and heading[0] != 0) else 'red'
 
-        # Populate oncoming, left, right
+        # Populate oncoming, left, right (only agents at the same intersection can be relevant)
         oncoming = None
         left = None
         right = None
-        for other_agent, other_state in self.agent_states.iteritems():
-            if agent == other_agent or location != other_state['location'] or (heading[0] == other_state['heading'][0] and heading[1] == other_state['heading'][1]):
+        for other_agent in self.intersection_agents[location]:
+            other_state = self.agent_states[other_agent]
+            if agent == other_agent or (heading[0] == other_state['heading'][0] and heading[1] == other_state['heading'][1]):
                 continue
             other_heading = other_agent.get_next_waypoint()
             if (heading[0] * other_state['heading'][0] + heading[1] * other_state['heading'][1]) == -1:
@@ -168,7 +216,8 @@ class Environment(object):
         state = self.agent_states[agent]
         location = state['location']
         heading = state['heading']
-        light = 'green' if (self.intersections[location].state and heading[1] != 0) or ((not self.intersections[location].state) and heading[0] != 0) else 'red'
+        light_state = self.light_state(location)
+        light = 'green' if (light_state and heading[1] != 0) or ((not light_state) and heading[0] != 0) else 'red'
         inputs = self.sense(agent)
 
         # Move agent if within bounds and obeys traffic rules
@@ -188,13 +237,18 @@ class Environment(object):
             else:
                 move_okay = False
 
+        if move_okay and action is not None:
+            next_location = self.next_location(location, heading)
+            if next_location is None:
+                move_okay = False  # no road that way
+
         if move_okay:
             # Valid move (could be null)
             if action is not None:
                 # Valid non-null move
-                location = ((location[0] + heading[0] - self.bounds[0]) % (self.bounds[2] - self.bounds[0] + 1) + self.bounds[0],
-                            (location[1] + heading[1] - self.bounds[1]) % (self.bounds[3] - self.bounds[1] + 1) + self.bounds[1])  # wrap-around
-                #if self.bounds[0] <= location[0] <= self.bounds[2] and self.bounds[1] <= location[1] <= self.bounds[3]:  # bounded
+                location = next_location
+                self.remove_agent(agent, state['location'])
+                self.place_agent(agent, location)
                 state['location'] = location
                 state['heading'] = heading
                 reward = 2.0 if action == agent.get_next_waypoint() else -0.5  # valid, but is it correct? (as per waypoint)
@@ -206,18 +260,54 @@ class Environment(object):
             reward = -1.0
 
         if agent is self.primary_agent:
+            self.trial_steps += 1
+            if not move_okay:
+                self.trial_violations += 1
             if state['location'] == state['destination']:
                 if state['deadline'] >= 0:
                     reward += 10  # bonus
+                    self.trial_success = True
                 self.done = True
-                print "Environment.act(): Primary agent has reached destination!"  # [debug]
-            self.status_text = "state: {}\naction: {}\nreward: {}".format(agent.get_state(), action, reward)
+                simlog.logger.info("Environment.act(): Primary agent has reached destination!")  # [debug]
+            self.status = (agent.get_state(), action, reward)
             #print "Environment.act() [POST]: location: {}, heading: {}, action: {}, reward: {}".format(location, heading, action, reward)  # [debug]
+            self.trial_reward += reward
 
         return reward
 
+    def light_state(self, location):
+        """State of the traffic light at location: True if North-South is open, False if East-West is open."""
+        i = self.intersections[location]
+        return self.light_initial.item(i) != (self.light_t // self.light_period.item(i)) % 2
+
+    def light_states(self):
+        """States of all traffic lights, in intersection order.
+
+        A light flips every period steps, from its initial state at the start of the trial.
+        """
+        return self.light_initial ^ ((self.light_t // self.light_period) % 2).astype(bool)
+
+    def next_location(self, location, heading):
+        """Intersection reached by driving one block from location along heading (None if there is no road)."""
+        if self.road_graph is not None:
+            return self.road_graph.neighbour(location, heading)
+        return ((location[0] + heading[0] - self.bounds[0]) % (self.bounds[2] - self.bounds[0] + 1) + self.bounds[0],
+                (location[1] + heading[1] - self.bounds[1]) % (self.bounds[3] - self.bounds[1] + 1) + self.bounds[1])  # wrap-around
+
+    @property
+    def status_text(self):
+        return "state: {}\naction: {}\nreward: {}".format(*self.status) if self.status is not None else ""
+
+    def max_route_distance(self):
+        """Largest compute_dist() between two intersections (-1 if none can be reached from another)."""
+        if self.road_graph is not None:
+            return int(self.road_graph.distances.max())
+        return (self.bounds[2] - self.bounds[0]) + (self.bounds[3] - self.bounds[1])
+
     def compute_dist(self, a, b):
-        """L1 distance between two points."""
+        """L1 distance between two points (no. of moves on a shortest route, for a road graph)."""
+        if self.road_graph is not None:
+            return self.road_graph.distance(a, b)
         return abs(b[0] - a[0]) + abs(b[1] - a[1])
 
 
@@ -0,0 +1,51 @@
+import time
+import random
+import numpy as np
+
+from environment import Agent, Environment
+from planner import RoutePlanner
+from vec_environment import VecEnvironment
+
+
+class RandomAgent(Agent):
+    """Primary agent doing what VecEnvironment does for its primary agents: plan, sense, act at random."""
+
+    def __init__(self, env):
+        super(RandomAgent, self).__init__(env)
+        self.planner = RoutePlanner(self.env, self)
+
+    def reset(self, destination=None):
+        self.planner.route_to(destination)
+
+    def update(self, t):
+        self.next_waypoint = self.planner.next_waypoint()
+        self.env.sense(self)
+        self.env.act(self, random.choice(Environment.valid_actions))
+
+
+# World steps per second: Environment (one world, stepped back-to-back) vs. VecEnvironment by no. of worlds
+n_env_steps = 20000
+vec_sizes = [1, 100, 1000, 10000]
+n_vec_steps = 200
+
+random.seed(0)
+environment = Environment()
+environment.set_primary_agent(environment.create_agent(RandomAgent), enforce_deadline=True)
+environment.reset()
+start = time.time()
+for i in xrange(n_env_steps):
+    if environment.done:
+        environment.reset()
+    environment.step()
+env_rate = n_env_steps / (time.time() - start)
+print "Environment: {:.0f} steps/s".format(env_rate)
+
+for n_envs in vec_sizes:
+    vec_environment = VecEnvironment(n_envs=n_envs, enforce_deadline=True, seed=0)
+    actions = np.random.RandomState(0).randint(len(Environment.valid_actions), size=(n_vec_steps, n_envs))
+    vec_environment.reset()
+    start = time.time()
+    for i in xrange(n_vec_steps):
+        vec_environment.step(actions[i])
+    vec_rate = n_vec_steps * n_envs / (time.time() - start)
+    print "VecEnvironment, {} worlds: {:.0f} world steps/s ({:.1f}x)".format(n_envs, vec_rate, vec_rate / env_rate)
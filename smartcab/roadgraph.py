@@ -0,0 +1 @@
+../other/roadgraph.py
\ No newline at end of file
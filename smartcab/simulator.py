@@ -1,7 +1,11 @@
 import os
 import time
+import timeit
 import random
 import importlib
+import numpy as np
+
+import simlog
 
 class Simulator(object):
     """Simulates agents in a dynamic smartcab environment.
@@ -21,6 +25,9 @@ class Simulator(object):
         'orange'  : (255, 128,   0)
     }
 
+    # Per-trial results returned by run(), one record per trial
+    trial_dtype = [('success', bool), ('steps', int), ('cum_reward', float), ('violations', int)]
+
     def __init__(self, env, size=None, update_delay=1.0, display=True):
         self.env = env
         self.size = size if size is not None else ((self.env.grid_size[0] + 1) * self.env.block_size, (self.env.grid_size[1] + 1) * self.env.block_size)
@@ -46,23 +53,46 @@ class Simulator(object):
                 self.frame_delay = max(1, int(self.update_delay * 1000))  # delay between GUI frames in ms (min: 1)
                 self.agent_sprite_size = (32, 32)
                 self.agent_circle_radius = 10  # radius of circle, when using simple representation
+                self.sprites = {}  # color -> heading -> car sprite, pre-rotated
+                self.labels = {}  # (text, color) -> rendered next waypoint label
                 for agent in self.env.agent_states:
-                    agent._sprite = self.pygame.transform.smoothscale(self.pygame.image.load(os.path.join("images", "car-{}.png".format(agent.color))), self.agent_sprite_size)
-                    agent._sprite_size = (agent._sprite.get_width(), agent._sprite.get_height())
+                    self.load_sprite(agent.color)
 
                 self.font = self.pygame.font.Font(None, 28)
                 self.paused = False
+
+                # Cached layers: static roads and intersections, and the same with the traffic lights (see draw)
+                self.background = None
+                self.background_roads = None  # roads the background was drawn from
+                self.light_layer = None
+                self.lights_drawn = {}  # intersection -> light state drawn on light_layer
+                self.dynamic_rects = []  # screen areas drawn over the light layer in the last frame
+                self.redraw = True  # next frame redraws the whole screen
             except ImportError as e:
                 self.display = False
-                print "Simulator.__init__(): Unable to import pygame; display disabled.\n{}: {}".format(e.__class__.__name__, e)
+                simlog.logger.warning("Simulator.__init__(): Unable to import pygame; display disabled.\n%s: %s", e.__class__.__name__, e)
             except Exception as e:
                 self.display = False
-                print "Simulator.__init__(): Error initializing GUI objects; display disabled.\n{}: {}".format(e.__class__.__name__, e)
+                simlog.logger.warning("Simulator.__init__(): Error initializing GUI objects; display disabled.\n%s: %s", e.__class__.__name__, e)
+
+    def run(self, n_trials=1, fps=None):
+        """Run n_trials trials and return their results as an array of trial_dtype records.
 
-    def run(self, n_trials=1):
+        Without display, trials are simulated back-to-back (see run_headless); update_delay is ignored.
+        With display, the environment steps every update_delay secs and the GUI is rendered (see run_display).
+        With display and fps=<frames per sec>, the environment steps as fast as possible instead, and the GUI
+        shows it fps times per sec (see run_monitor).
+        """
+        if not self.display:
+            return self.run_headless(n_trials)
+        return self.run_monitor(n_trials, fps) if fps is not None else self.run_display(n_trials)
+
+    def run_display(self, n_trials=1):
+        """Step the environment every update_delay secs, rendering the GUI."""
+        results = np.zeros(n_trials, dtype=self.trial_dtype)
         self.quit = False
         for trial in xrange(n_trials):
-            print "Simulator.run(): Trial {}".format(trial)  # [debug]
+            simlog.logger.info("Simulator.run(): Trial %s", trial)  # [debug]
             self.env.reset()
             self.current_time = 0.0
             self.last_updated = 0.0
@@ -75,17 +105,7 @@ class Simulator(object):
 
                     # Handle GUI events
                     if self.display:
-                        for event in self.pygame.event.get():
-                            if event.type == self.pygame.QUIT:
-                                self.quit = True
-                            elif event.type == self.pygame.KEYDOWN:
-                                if event.key == 27:  # Esc
-                                    self.quit = True
-                                elif event.unicode == u' ':
-                                    self.paused = True
-
-                        if self.paused:
-                            self.pause()
+                        self.handle_events()
 
                     # Update environment
                     if self.current_time - self.last_updated >= self.update_delay:
@@ -103,69 +123,186 @@ class Simulator(object):
                         break
 
             if self.quit:
-                break
+                return results[:trial]
+            self.record_trial(results, trial)
+
+        return results
+
+    def run_monitor(self, n_trials=1, fps=5):
+        """Step the environment as fast as possible, rendering the GUI fps times per sec (wall-clock time).
+
+        Each frame shows the environment as it is at that moment: most steps are never drawn, and the run only
+        pays for a clock read per step, plus the frames. Keys are handled at every frame (Space pauses, Esc quits).
+        """
+        results = np.zeros(n_trials, dtype=self.trial_dtype)
+        env = self.env
+        clock = timeit.default_timer
+        frame_interval = 1.0 / fps
+        next_frame = clock()
+        self.quit = False
+        for trial in xrange(n_trials):
+            simlog.logger.info("Simulator.run(): Trial %s", trial)  # [debug]
+            self.start_time = time.time()
+            try:
+                env.reset()
+                while not env.done:
+                    env.step()
+                    if clock() >= next_frame:
+                        self.handle_events()
+                        if self.quit:
+                            return results[:trial]
+                        self.render()
+                        next_frame = clock() + frame_interval
+            except KeyboardInterrupt:
+                self.quit = True
+                return results[:trial]
+            self.record_trial(results, trial)
+
+        return results
+
+    def run_headless(self, n_trials=1):
+        """Step the environment as fast as possible, with no GUI and no wall-clock timing."""
+        results = np.zeros(n_trials, dtype=self.trial_dtype)
+        env = self.env
+        self.quit = False
+        for trial in xrange(n_trials):
+            simlog.logger.info("Simulator.run(): Trial %s", trial)  # [debug]
+            try:
+                env.reset()
+                while not env.done:
+                    env.step()
+            except KeyboardInterrupt:
+                self.quit = True
+                return results[:trial]
+            self.record_trial(results, trial)
+
+        return results
+
+    def record_trial(self, results, trial):
+        results[trial] = (self.env.trial_success, self.env.trial_steps, self.env.trial_reward, self.env.trial_violations)
+
+    def load_sprite(self, color):
+        """Car sprite of the given color, rotated for each heading (loaded once per color)."""
+        if color not in self.sprites:
+            sprite = self.pygame.transform.smoothscale(self.pygame.image.load(os.path.join("images", "car-{}.png".format(color))), self.agent_sprite_size)
+            sprite = sprite.convert_alpha()  # in the display's pixel format: much faster to blit
+            self.sprites[color] = dict(
+                (heading, sprite if heading == (1, 0) else self.pygame.transform.rotate(sprite, 180 if heading[0] == -1 else heading[1] * -90))
+                for heading in self.env.valid_headings)
+        return self.sprites[color]
 
     def render(self):
-        # Clear screen
-        self.screen.fill(self.bg_color)
-
-        # Draw elements
-        # * Static elements
-        for road in self.env.roads:
-            self.pygame.draw.line(self.screen, self.road_color, (road[0][0] * self.env.block_size, road[0][1] * self.env.block_size), (road[1][0] * self.env.block_size, road[1][1] * self.env.block_size), self.road_width)
-
-        for intersection, traffic_light in self.env.intersections.iteritems():
-            self.pygame.draw.circle(self.screen, self.road_color, (intersection[0] * self.env.block_size, intersection[1] * self.env.block_size), 10)
-            if traffic_light.state:  # North-South is open
-                self.pygame.draw.line(self.screen, self.colors['green'],
-                    (intersection[0] * self.env.block_size, intersection[1] * self.env.block_size - 15),
-                    (intersection[0] * self.env.block_size, intersection[1] * self.env.block_size + 15), self.road_width)
-            else:  # East-West is open
-                self.pygame.draw.line(self.screen, self.colors['green'],
-                    (intersection[0] * self.env.block_size - 15, intersection[1] * self.env.block_size),
-                    (intersection[0] * self.env.block_size + 15, intersection[1] * self.env.block_size), self.road_width)
+        lights = zip(self.env.intersections, self.env.light_states().tolist())
+        cars = [(state['location'], state['heading'], agent.color, agent.get_next_waypoint(), state['destination'])
+                for agent, state in self.env.agent_states.iteritems()]
+        self.draw(self.env.roads, lights, cars, self.env.status_text)
+
+    def draw_background(self, roads, intersections):
+        """Draw the static layer (roads and intersections) once, and reset the light layer on top of it."""
+        self.background = self.pygame.Surface(self.size).convert()
+        self.background.fill(self.bg_color)
+        for road in roads:
+            self.pygame.draw.line(self.background, self.road_color, (road[0][0] * self.env.block_size, road[0][1] * self.env.block_size), (road[1][0] * self.env.block_size, road[1][1] * self.env.block_size), self.road_width)
+        for intersection in intersections:
+            self.pygame.draw.circle(self.background, self.road_color, (intersection[0] * self.env.block_size, intersection[1] * self.env.block_size), 10)
+        self.background_roads = roads
+        self.light_layer = self.background.copy()
+        self.lights_drawn = {}
+        self.redraw = True
+
+    def draw(self, roads, lights, cars, status_text):
+        """Draw one frame: roads, (intersection, NS open) lights, (location, heading, color, next waypoint, destination) cars.
+
+        Only what changed is redrawn: roads are cached in a background layer and lights in a layer on top of it,
+        updated when they switch. Each frame erases the last frame's cars and overlays from the light layer, draws
+        the new ones, and sends just those areas (dirty rects) to the display.
+        """
+        if roads is not self.background_roads:
+            self.draw_background(roads, [intersection for intersection, state in lights])
+
+        # * Traffic lights, on the light layer
+        dirty = []
+        for intersection, state in lights:
+            if self.lights_drawn.get(intersection) != state:
+                self.lights_drawn[intersection] = state
+                x, y = intersection[0] * self.env.block_size, intersection[1] * self.env.block_size
+                rect = self.pygame.Rect(x - 16, y - 16, 33, 33)
+                self.light_layer.blit(self.background, rect, rect)
+                if state:  # North-South is open
+                    self.pygame.draw.line(self.light_layer, self.colors['green'], (x, y - 15), (x, y + 15), self.road_width)
+                else:  # East-West is open
+                    self.pygame.draw.line(self.light_layer, self.colors['green'], (x - 15, y), (x + 15, y), self.road_width)
+                dirty.append(rect)
+
+        # Erase the last frame (or start over, e.g. after a pause)
+        if self.redraw:
+            self.screen.blit(self.light_layer, (0, 0))
+            dirty = [self.screen.get_rect()]
+            self.redraw = False
+        else:
+            dirty += self.dynamic_rects
+            for rect in dirty:
+                self.screen.blit(self.light_layer, rect, rect)
 
         # * Dynamic elements
-        for agent, state in self.env.agent_states.iteritems():
+        drawn = []
+        for location, heading, color, next_waypoint, destination in cars:
             # Compute precise agent location here (back from the intersection some)
-            agent_offset = (2 * state['heading'][0] * self.agent_circle_radius, 2 * state['heading'][1] * self.agent_circle_radius)
-            agent_pos = (state['location'][0] * self.env.block_size - agent_offset[0], state['location'][1] * self.env.block_size - agent_offset[1])
-            agent_color = self.colors[agent.color]
-            if hasattr(agent, '_sprite') and agent._sprite is not None:
-                # Draw agent sprite (image), properly rotated
-                rotated_sprite = agent._sprite if state['heading'] == (1, 0) else self.pygame.transform.rotate(agent._sprite, 180 if state['heading'][0] == -1 else state['heading'][1] * -90)
-                self.screen.blit(rotated_sprite,
-                    self.pygame.rect.Rect(agent_pos[0] - agent._sprite_size[0] / 2, agent_pos[1] - agent._sprite_size[1] / 2,
-                        agent._sprite_size[0], agent._sprite_size[1]))
+            agent_offset = (2 * heading[0] * self.agent_circle_radius, 2 * heading[1] * self.agent_circle_radius)
+            agent_pos = (location[0] * self.env.block_size - agent_offset[0], location[1] * self.env.block_size - agent_offset[1])
+            agent_color = self.colors[color]
+            sprites = self.sprites.get(color)
+            if sprites is not None:
+                # Draw agent sprite (image), pre-rotated
+                sprite = sprites[heading]
+                drawn.append(self.screen.blit(sprite, (agent_pos[0] - sprite.get_width() / 2, agent_pos[1] - sprite.get_height() / 2)))
             else:
                 # Draw simple agent (circle with a short line segment poking out to indicate heading)
-                self.pygame.draw.circle(self.screen, agent_color, agent_pos, self.agent_circle_radius)
-                self.pygame.draw.line(self.screen, agent_color, agent_pos, state['location'], self.road_width)
-            if agent.get_next_waypoint() is not None:
-                self.screen.blit(self.font.render(agent.get_next_waypoint(), True, agent_color, self.bg_color), (agent_pos[0] + 10, agent_pos[1] + 10))
-            if state['destination'] is not None:
-                self.pygame.draw.circle(self.screen, agent_color, (state['destination'][0] * self.env.block_size, state['destination'][1] * self.env.block_size), 6)
-                self.pygame.draw.circle(self.screen, agent_color, (state['destination'][0] * self.env.block_size, state['destination'][1] * self.env.block_size), 15, 2)
+                drawn.append(self.pygame.draw.circle(self.screen, agent_color, agent_pos, self.agent_circle_radius))
+                drawn.append(self.pygame.draw.line(self.screen, agent_color, agent_pos, location, self.road_width))
+            if next_waypoint is not None:
+                label = self.labels.get((next_waypoint, color))
+                if label is None:
+                    label = self.labels[(next_waypoint, color)] = self.font.render(next_waypoint, True, agent_color, self.bg_color).convert()
+                drawn.append(self.screen.blit(label, (agent_pos[0] + 10, agent_pos[1] + 10)))
+            if destination is not None:
+                drawn.append(self.pygame.draw.circle(self.screen, agent_color, (destination[0] * self.env.block_size, destination[1] * self.env.block_size), 6))
+                drawn.append(self.pygame.draw.circle(self.screen, agent_color, (destination[0] * self.env.block_size, destination[1] * self.env.block_size), 15, 2))
 
         # * Overlays
         text_y = 10
-        for text in self.env.status_text.split('\n'):
-            self.screen.blit(self.font.render(text, True, self.colors['red'], self.bg_color), (100, text_y))
+        for text in status_text.split('\n'):
+            drawn.append(self.screen.blit(self.font.render(text, True, self.colors['red'], self.bg_color), (100, text_y)))
             text_y += 20
 
-        # Flip buffers
-        self.pygame.display.flip()
+        # Update the changed areas of the display
+        self.dynamic_rects = drawn
+        self.pygame.display.update(dirty + drawn)
+
+    def handle_events(self):
+        """Handle pending GUI events: closing the window or Esc quits, Space pauses (until a key is pressed)."""
+        for event in self.pygame.event.get():
+            if event.type == self.pygame.QUIT:
+                self.quit = True
+            elif event.type == self.pygame.KEYDOWN:
+                if event.key == 27:  # Esc
+                    self.quit = True
+                elif event.unicode == u' ':
+                    self.paused = True
+
+        if self.paused:
+            self.pause()
 
     def pause(self):
         abs_pause_time = time.time()
         pause_text = "[PAUSED] Press any key to continue..."
         self.screen.blit(self.font.render(pause_text, True, self.colors['cyan'], self.bg_color), (100, self.height - 40))
         self.pygame.display.flip()
-        print pause_text  # [debug]
+        simlog.logger.info(pause_text)  # [debug]
         while self.paused:
             for event in self.pygame.event.get():
                 if event.type == self.pygame.KEYDOWN:
                     self.paused = False
             self.pygame.time.wait(self.frame_delay)
-        self.screen.blit(self.font.render(pause_text, True, self.bg_color, self.bg_color), (100, self.height - 40))
+        self.redraw = True  # the pause text is drawn over every layer
         self.start_time += (time.time() - abs_pause_time)
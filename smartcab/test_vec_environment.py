@@ -0,0 +1,151 @@
+import random
+import unittest
+
+import numpy as np
+
+from environment import Agent, DummyAgent, Environment
+from planner import RoutePlanner
+from vec_environment import VecEnvironment
+
+
+class ScriptedAgent(Agent):
+    """Primary agent taking the action it is given, keeping what it sensed and the reward it got."""
+
+    def __init__(self, env):
+        super(ScriptedAgent, self).__init__(env)
+        self.planner = RoutePlanner(self.env, self)
+        self.action = None
+        self.observation = None
+        self.reward = None
+
+    def reset(self, destination=None):
+        self.planner.route_to(destination)
+
+    def update(self, t):
+        self.next_waypoint = self.planner.next_waypoint()
+        inputs = self.env.sense(self)
+        self.observation = [int(inputs['light'] == 'green')] + \
+            [Environment.valid_actions.index(inputs[name]) for name in ('oncoming', 'left', 'right')] + \
+            [Environment.valid_actions.index(self.next_waypoint), self.env.agent_states[self]['deadline']]
+        self.reward = self.env.act(self, self.action)
+
+
+class ReplayedDummyAgent(DummyAgent):
+    """DummyAgent whose waypoints are given (before each tick) instead of drawn at random."""
+
+    def __init__(self, env):
+        super(ReplayedDummyAgent, self).__init__(env)
+        self.waypoint_after = None  # next waypoint once this tick's update is done
+
+    def update(self, t):
+        super(ReplayedDummyAgent, self).update(t)
+        self.next_waypoint = self.waypoint_after
+
+
+class RecordingVecEnvironment(VecEnvironment):
+    """VecEnvironment keeping the state each tick starts from, before lights and dummies are updated."""
+
+    def _advance(self):
+        self.tick_start = {
+            'new_trial': self.t == 0,
+            'location': self.location.copy(),
+            'heading': self.heading.copy(),
+            'waypoint': self.waypoint.copy(),
+            'light_initial': self.light_initial.copy(),
+        }
+        super(RecordingVecEnvironment, self)._advance()
+
+
+class VecEnvironmentEquivalenceTest(unittest.TestCase):
+    """Each world of a VecEnvironment steps exactly like an Environment started from the same state.
+
+    The Environments get each world's trial setup (lights, cars, route) and the dummies' random waypoints, which
+    are drawn from other random streams; everything else (lights, sensing, right of way, moves, routes,
+    rewards, deadlines, trial ends) is simulated by each on its own and compared at every step.
+    """
+
+    n_envs = 4
+    n_steps = 300
+
+    def check_equivalence(self, enforce_deadline, num_dummies=3):
+        random.seed(0)
+        vec = RecordingVecEnvironment(n_envs=self.n_envs, num_dummies=num_dummies, enforce_deadline=enforce_deadline,
+                                      seed=0)
+        envs = []
+        for i in xrange(self.n_envs):
+            env = Environment(num_dummies=0)
+            for k in xrange(vec.num_dummies):
+                env.create_agent(ReplayedDummyAgent)
+            env.set_primary_agent(env.create_agent(ScriptedAgent), enforce_deadline=enforce_deadline)
+            envs.append(env)
+
+        rng = np.random.RandomState(0)
+        observations = vec.reset()
+        n_trials = 0
+        for step in xrange(self.n_steps):
+            actions = rng.randint(len(Environment.valid_actions), size=self.n_envs)
+            start = vec.tick_start
+            for i, env in enumerate(envs):
+                if start['new_trial'][i]:
+                    self.start_trial(env, vec, i)
+                    n_trials += 1
+                for k, agent in enumerate(env.agent_states):
+                    if isinstance(agent, ReplayedDummyAgent):
+                        agent.next_waypoint = Environment.valid_actions[start['waypoint'][i, k]]
+                        agent.waypoint_after = Environment.valid_actions[vec.waypoint[i, k]]
+                env.primary_agent.action = Environment.valid_actions[actions[i]]
+                env.step()
+
+            lights = vec.light_states()
+            sensed = observations
+            observations, rewards, done, info = vec.step(actions)
+            for i, env in enumerate(envs):
+                self.assertEqual(env.light_states().tolist(), lights[i].tolist())
+                self.assertEqual(env.primary_agent.observation, sensed[i].tolist())
+                self.assertEqual(env.primary_agent.reward, rewards[i])
+                self.assertEqual(env.done, done[i])
+                self.assertEqual(env.trial_success, info['success'][i])
+                if not done[i]:
+                    self.assertEqual(self.cars(env), self.vec_cars(vec, i))
+        self.assertGreater(n_trials, self.n_envs)
+
+    def start_trial(self, env, vec, i):
+        """Reset env, then set it up as world i's new trial."""
+        env.reset()
+        start = vec.tick_start
+        env.light_initial = start['light_initial'][i].copy()
+        env.light_period = vec.light_period[i].copy()
+        for state in env.agent_states.itervalues():
+            del env.intersection_agents[state['location']][:]
+        for k, agent in enumerate(env.agent_states):
+            state = env.agent_states[agent]
+            state['location'] = vec.intersections[start['location'][i, k]]
+            state['heading'] = Environment.valid_headings[start['heading'][i, k]]
+            env.place_agent(agent, state['location'])
+        state = env.agent_states[env.primary_agent]
+        state['destination'] = vec.intersections[vec.destination[i]]
+        state['deadline'] = vec.deadline[i]
+        env.primary_agent.reset(state['destination'])
+
+    def cars(self, env):
+        """(location, heading) of every car, in agent order."""
+        return [(state['location'], state['heading']) for state in env.agent_states.itervalues()]
+
+    def vec_cars(self, vec, i):
+        """Same for world i of vec, as the next tick starts."""
+        start = vec.tick_start
+        return [(vec.intersections[start['location'][i, k]], Environment.valid_headings[start['heading'][i, k]])
+                for k in xrange(vec.num_agents)]
+
+    def test_enforce_deadline(self):
+        self.check_equivalence(enforce_deadline=True)
+
+    def test_hard_time_limit(self):
+        self.check_equivalence(enforce_deadline=False)
+
+    def test_crowded(self):
+        self.check_equivalence(enforce_deadline=True, num_dummies=30)  # several cars at most intersections
+
+
+if __name__ == '__main__':
+    unittest.main()
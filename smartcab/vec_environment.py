@@ -0,0 +1,297 @@
+import numpy as np
+
+from environment import Environment
+
+# Integer codes for actions/inputs: indices into Environment.valid_actions
+NONE, FORWARD, LEFT, RIGHT = range(len(Environment.valid_actions))
+
+# Columns of an observation array (light: 1 for green; oncoming, left, right, next_waypoint: action codes)
+observation_fields = ['light', 'oncoming', 'left', 'right', 'next_waypoint', 'deadline']
+
+
+class VecEnvironment(object):
+    """Many independent smartcab worlds advanced in lock-step.
+
+    Each world follows the same rules as Environment (num_dummies dummy cars plus one
+    primary agent, updated in creation order), but locations, headings, waypoints,
+    deadlines and traffic lights are NumPy arrays with one row per world. Locations are
+    intersection indices, headings are indices into Environment.valid_headings, and actions
+    and sensed inputs are indices into Environment.valid_actions.
+
+    Worlds whose trial ends during step() start a new trial right away, so every call
+    advances all n_envs worlds by one tick.
+
+    The interface is Gym-style: reset() and step() return observations as an
+    (n_envs, len(observation_fields)) int array, so a learner drives every world with one
+    call per tick, without any Agent object.
+    """
+
+    valid_actions = Environment.valid_actions
+    valid_headings = Environment.valid_headings
+    hard_time_limit = Environment.hard_time_limit
+
+    def __init__(self, n_envs=1, num_dummies=3, enforce_deadline=False, seed=None):
+        self.n_envs = n_envs
+        self.num_dummies = num_dummies
+        self.num_agents = num_dummies + 1
+        self.primary = num_dummies  # primary agent is created last, so it is updated last
+        self.enforce_deadline = enforce_deadline
+        self.random = np.random.RandomState(seed)
+
+        # Road network (same layout and intersection order as Environment)
+        self.grid_size = (8, 6)  # (cols, rows)
+        self.bounds = (1, 1, self.grid_size[0], self.grid_size[1])
+        self.block_size = 100
+        self.intersections = [(x, y)
+                              for x in xrange(self.bounds[0], self.bounds[2] + 1)
+                              for y in xrange(self.bounds[1], self.bounds[3] + 1)]
+        self._build_tables()
+
+        # Traffic lights, as in Environment: each light only depends on its initial state, its period and the time
+        n_intersections = len(self.intersections)
+        self.light_initial = self.random.randint(2, size=(n_envs, n_intersections)).astype(bool)  # True = NS open
+        self.light_period = self.random.choice([3, 4, 5], size=(n_envs, n_intersections))
+        self.light_t = np.zeros(n_envs, dtype=int)  # time of the lights' last update, by world
+        self._cells = np.arange(n_envs) * n_intersections  # offset of each world's row in the (flattened) light arrays
+
+        # Agents: column k is the k-th agent of every world
+        shape = (n_envs, self.num_agents)
+        self.location = self.random.randint(n_intersections, size=shape)
+        self.heading = np.full(shape, self.valid_headings.index((0, 1)), dtype=int)
+        self.waypoint = self.random.randint(FORWARD, RIGHT + 1, size=shape)
+        self.waypoint[:, self.primary] = NONE
+
+        # Primary agent trial state
+        self.destination = np.zeros(n_envs, dtype=int)
+        self.deadline = np.zeros(n_envs, dtype=int)
+        self.t = np.zeros(n_envs, dtype=int)
+        self.inputs = None
+
+    def _build_tables(self):
+        """Precompute moves, routing, right-of-way rules and rewards as lookup tables.
+
+        The tables are indexed with flat indices (np.take), which is much cheaper than one index array per axis.
+        """
+        index = dict((xy, i) for i, xy in enumerate(self.intersections))
+        cols = self.bounds[2] - self.bounds[0] + 1
+        rows = self.bounds[3] - self.bounds[1] + 1
+        n = len(self.intersections)
+
+        # Location reached by moving one block from each intersection along each heading (wrap-around)
+        self._neighbour = np.zeros((n, len(self.valid_headings)), dtype=int)
+        for i, (x, y) in enumerate(self.intersections):
+            for h, heading in enumerate(self.valid_headings):
+                self._neighbour[i, h] = index[((x + heading[0] - self.bounds[0]) % cols + self.bounds[0],
+                                               (y + heading[1] - self.bounds[1]) % rows + self.bounds[1])]
+        self._dist = np.array([[abs(b[0] - a[0]) + abs(b[1] - a[1]) for b in self.intersections] for a in self.intersections])
+
+        # Heading and location after each action, by (heading, action) and (location, heading, action) (NONE: stay)
+        self._turned = np.zeros((len(self.valid_headings), len(self.valid_actions)), dtype=int)
+        self._moved_to = np.zeros((n, len(self.valid_headings), len(self.valid_actions)), dtype=int)
+        for h in xrange(len(self.valid_headings)):
+            for action, turn in zip([NONE, FORWARD, LEFT, RIGHT], [0, 0, 1, 3]):  # ENWS order: left is +1, right is -1
+                self._turned[h, action] = (h + turn) % len(self.valid_headings)
+                self._moved_to[:, h, action] = self._neighbour[:, self._turned[h, action]] if action != NONE else np.arange(n)
+
+        # RoutePlanner.next_waypoint for every (location, heading, destination)
+        self._route = np.zeros((n, len(self.valid_headings), n), dtype=int)
+        for i, location in enumerate(self.intersections):
+            for h, heading in enumerate(self.valid_headings):
+                for j, destination in enumerate(self.intersections):
+                    self._route[i, h, j] = self.valid_actions.index(grid_waypoint(location, heading, destination))
+
+        # Environment.act move_okay and DummyAgent.update action_okay, by (action, light, oncoming, left)
+        shape = (len(self.valid_actions), 2, len(self.valid_actions), len(self.valid_actions))
+        self._move_okay = np.ones(shape, dtype=bool)
+        self._dummy_okay = np.ones(shape, dtype=bool)
+        for light in (0, 1):  # 1 = green
+            for oncoming in xrange(shape[2]):
+                for left in xrange(shape[3]):
+                    self._move_okay[FORWARD, light, oncoming, left] = light == 1
+                    self._move_okay[LEFT, light, oncoming, left] = light == 1 and oncoming in (NONE, LEFT)
+                    self._move_okay[RIGHT, light, oncoming, left] = light == 1 or left != FORWARD
+                    self._dummy_okay[FORWARD, light, oncoming, left] = light == 1
+                    self._dummy_okay[LEFT, light, oncoming, left] = light == 1 and oncoming not in (FORWARD, RIGHT)
+                    self._dummy_okay[RIGHT, light, oncoming, left] = light == 1 or left != FORWARD
+
+        # Environment.act reward by (move okay, action, action is the waypoint)
+        self._reward = np.array([[[-1.0, -1.0]] * len(self.valid_actions),
+                                 [[0.0, 0.0]] + [[-0.5, 2.0]] * (len(self.valid_actions) - 1)])
+
+    def reset(self):
+        """Start a new trial in every world; returns the observations."""
+        self._start_trials(np.ones(self.n_envs, dtype=bool))
+        self._advance()
+        return self.observe()
+
+    def sense(self):
+        """Inputs of the primary agent in every world, as a dict of arrays.
+
+        'light' is True for green; 'oncoming', 'left', 'right' and 'next_waypoint' are action codes.
+        """
+        return self.inputs
+
+    def observe(self):
+        """Inputs of the primary agent in every world, as an array of observation_fields columns."""
+        inputs = self.inputs
+        return np.column_stack([inputs['light'], inputs['oncoming'], inputs['left'], inputs['right'],
+                                inputs['next_waypoint'], inputs['deadline']]).astype(int)
+
+    def step(self, actions):
+        """Let the primary agent of every world take an action (an action code each), then advance one tick.
+
+        Returns (observations, rewards, done, info), info holding 'success' (arrived in time) and 'timeout' (done
+        without success) flags by world.
+        Worlds flagged in done have already been reset: their observations are of their new trial.
+        """
+        actions = np.asarray(actions)
+        inputs = (self.inputs['light'], self.inputs['oncoming'], self.inputs['left'])
+        rewards = self._act(self.primary, actions, inputs)
+
+        # Primary agent reaching its destination ends the trial immediately
+        arrived = self.location[:, self.primary] == self.destination
+        success = arrived & (self.deadline >= 0)  # late arrivals get no bonus and are no success
+        rewards += 10.0 * success
+
+        # Deadline bookkeeping, as in Environment.step
+        timeout = self.deadline <= self.hard_time_limit
+        if self.enforce_deadline:
+            timeout |= self.deadline <= 0
+        done = arrived | timeout
+        self.deadline -= 1
+        self.t += 1
+
+        self._start_trials(done)
+        self._advance()
+        return self.observe(), rewards, done, {'success': success, 'timeout': done & ~success}
+
+    def _start_trials(self, mask):
+        """Environment.reset for the worlds selected by mask."""
+        idx = np.flatnonzero(mask)
+        n = len(idx)
+        if n == 0:
+            return
+        n_intersections = len(self.intersections)
+        n_headings = len(self.valid_headings)
+
+        # Pick a start and a destination, ensuring they are not too close
+        start = self.random.randint(n_intersections, size=n)
+        destination = self.random.randint(n_intersections, size=n)
+        close = self._dist[start, destination] < Environment.min_route_distance
+        while close.any():
+            m = close.sum()
+            start[close] = self.random.randint(n_intersections, size=m)
+            destination[close] = self.random.randint(n_intersections, size=m)
+            close = self._dist[start, destination] < Environment.min_route_distance
+
+        # Lights carry on from the last trial
+        self.light_initial[idx] ^= ((self.light_t[idx, None] // self.light_period[idx]) % 2).astype(bool)
+        self.light_t[idx] = 0
+
+        # Dummy agents are scattered randomly; the primary agent gets the start location
+        self.location[idx] = self.random.randint(n_intersections, size=(n, self.num_agents))
+        self.heading[idx] = self.random.randint(n_headings, size=(n, self.num_agents))
+        self.location[idx, self.primary] = start
+        self.heading[idx, self.primary] = self.random.randint(n_headings, size=n)
+
+        self.destination[idx] = destination
+        self.deadline[idx] = self._dist[start, destination] * 5
+        self.t[idx] = 0
+
+    def light_states(self):
+        """States of all traffic lights (True if North-South is open), by world and intersection."""
+        return self.light_initial ^ ((self.light_t[:, None] // self.light_period) % 2).astype(bool)
+
+    def _advance(self):
+        """Start of a tick: update lights (see light_states) and dummies, then sense for the primary agent."""
+        self.light_t[:] = self.t
+
+        for k in xrange(self.num_dummies):
+            self._dummy_update(k)
+
+        p = self.primary
+        n_intersections = len(self.intersections)
+        route = (self.location[:, p] * len(self.valid_headings) + self.heading[:, p]) * n_intersections + self.destination
+        self.waypoint[:, p] = self._route.take(route)
+        light, oncoming, left, right = self._sense(p)
+        self.inputs = {'light': light, 'oncoming': oncoming, 'left': left, 'right': right,
+                       'next_waypoint': self.waypoint[:, p].copy(), 'deadline': self.deadline.copy()}
+
+    def _dummy_update(self, k):
+        """Same right-of-way rules as DummyAgent.update, for agent k of every world."""
+        light, oncoming, left, _ = self._sense(k)
+        waypoint = self.waypoint[:, k]
+        action_okay = self._dummy_okay.take(self._rule_index(waypoint, light, oncoming, left))
+        action = np.where(action_okay, waypoint, NONE)
+        self.waypoint[:, k] = np.where(action_okay, self.random.randint(FORWARD, RIGHT + 1, size=self.n_envs), waypoint)
+        self._move(k, action)  # dummies never attempt a disallowed move
+
+    def _sense(self, k):
+        location = self.location[:, k]
+        heading = self.heading[:, k]
+        cells = self._cells + location
+        ns_open = self.light_initial.take(cells) ^ ((self.light_t // self.light_period.take(cells)) % 2).astype(bool)
+        light = ns_open == (heading % 2 == 1)  # odd headings are N/S
+
+        # Populate oncoming, left, right (in agent order, with the same precedence as Environment.sense), only in
+        # the few worlds where another car is at the same intersection
+        oncoming = np.zeros(self.n_envs, dtype=int)
+        left = np.zeros(self.n_envs, dtype=int)
+        right = np.zeros(self.n_envs, dtype=int)
+        for j in xrange(self.num_agents):
+            if j == k:
+                continue
+            w = np.flatnonzero(self.location[:, j] == location)
+            if len(w) == 0:
+                continue
+            relative = (self.heading[w, j] - heading[w]) % 4  # 0: same, 1: from the right, 2: oncoming, 3: from the left
+            other_waypoint = self.waypoint[w, j]
+            oncoming_w, left_w, right_w = oncoming[w], left[w], right[w]
+            oncoming[w] = np.where((relative == 2) & (oncoming_w != LEFT), other_waypoint, oncoming_w)
+            right[w] = np.where((relative == 1) & (right_w != FORWARD) & (right_w != LEFT), other_waypoint, right_w)
+            left[w] = np.where((relative == 3) & (left_w != FORWARD), other_waypoint, left_w)
+
+        return light, oncoming, left, right
+
+    def _rule_index(self, action, light, oncoming, left):
+        """Flat index into _move_okay and _dummy_okay."""
+        n_actions = len(self.valid_actions)
+        return ((action * 2 + light) * n_actions + oncoming) * n_actions + left
+
+    def _act(self, k, action, inputs):
+        """Move agent k of every world as in Environment.act; returns the rewards."""
+        move_okay = self._move_okay.take(self._rule_index(action, *inputs))
+        self._move(k, np.where(move_okay, action, NONE))
+        return self._reward.take((move_okay * len(self.valid_actions) + action) * 2 + (action == self.waypoint[:, k]))
+
+    def _move(self, k, action):
+        """Turn and move agent k of every world as action says (no checks)."""
+        location, heading = self.location[:, k], self.heading[:, k]
+        n_actions = len(self.valid_actions)
+        self.location[:, k] = self._moved_to.take((location * len(self.valid_headings) + heading) * n_actions + action)
+        self.heading[:, k] = self._turned.take(heading * n_actions + action)
+
+
+def grid_waypoint(location, heading, destination):
+    """Same logic as RoutePlanner.next_waypoint, for explicit arguments."""
+    delta = (destination[0] - location[0], destination[1] - location[1])
+    if delta[0] == 0 and delta[1] == 0:
+        return None
+    elif delta[0] != 0:  # EW difference
+        if delta[0] * heading[0] > 0:  # facing correct EW direction
+            return 'forward'
+        elif delta[0] * heading[0] < 0:  # facing opposite EW direction
+            return 'right'  # long U-turn
+        elif delta[0] * heading[1] > 0:
+            return 'left'
+        else:
+            return 'right'
+    else:  # NS difference (turn logic is slightly different)
+        if delta[1] * heading[1] > 0:  # facing correct NS direction
+            return 'forward'
+        elif delta[1] * heading[1] < 0:  # facing opposite NS direction
+            return 'right'  # long U-turn
+        elif delta[1] * heading[0] > 0:
+            return 'right'
+        else:
+            return 'left'